@@ -0,0 +1,15 @@
+-- Partitions an existing transparencia.punicao by base_origem, as in transparencia.sql.
+-- Run once before deploying the punicao ETL that replaces one partition per base:
+-- on an unpartitioned table ClickHouseSink.replace_partitions refuses to load.
+
+CREATE TABLE transparencia.punicao__partitioned AS transparencia.punicao
+ENGINE = MergeTree
+PARTITION BY base_origem
+ORDER BY documento
+SETTINGS index_granularity = 8192;
+
+INSERT INTO transparencia.punicao__partitioned SELECT * FROM transparencia.punicao;
+
+EXCHANGE TABLES transparencia.punicao AND transparencia.punicao__partitioned;
+
+DROP TABLE transparencia.punicao__partitioned;
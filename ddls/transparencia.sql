@@ -103,6 +103,8 @@ CREATE TABLE transparencia.punicao
     `inicio_punicao` Date
 )
 ENGINE = MergeTree
+-- One partition per source, replaced on its own by each load
+PARTITION BY base_origem
 ORDER BY documento
 SETTINGS index_granularity = 8192;
 
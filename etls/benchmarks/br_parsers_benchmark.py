@@ -0,0 +1,87 @@
+"""
+Compares br_parsers with the conversions it replaced, on synthetic columns of
+dd/mm/YYYY dates and 1.234,56 values as found in the portal and TSE files.
+
+    python benchmarks/br_parsers_benchmark.py --rows 5000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import br_parsers  # noqa: E402
+
+
+def synthetic_dates(rows: int, days: int, seed: int = 0) -> pd.Series:
+    """
+    `rows` dates drawn from `days` consecutive days
+    """
+    rng = np.random.default_rng(seed)
+    calendar = pd.date_range("2015-01-01", periods=days).strftime("%d/%m/%Y").to_numpy(dtype=object)
+    return pd.Series(calendar[rng.integers(0, days, rows)])
+
+
+def synthetic_decimals(rows: int, max_cents: int = 10 ** 9, seed: int = 0) -> pd.Series:
+    """
+    `rows` amounts below `max_cents`, formatted with thousands separators and a
+    decimal comma
+    """
+    rng = np.random.default_rng(seed)
+    cents = rng.integers(0, max_cents, rows)
+    return pd.Series([f"{c / 100:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".") for c in cents])
+
+
+def timed(name: str, function, series: pd.Series):
+    start = time.perf_counter()
+    result = function(series)
+    elapsed = time.perf_counter() - start
+    print(f"{name:32} {elapsed:8.2f}s")
+    return result, elapsed
+
+
+def dob_to_int(dob):
+    if type(dob) == str:
+        split_dob = dob.split('/')
+        return int(split_dob[2] + split_dob[1] + split_dob[0])
+    else:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=3650, help="distinct dates in the column")
+    args = parser.parse_args()
+
+    dates = synthetic_dates(args.rows, args.days)
+    print(f"{args.rows} dates, {args.days} distinct")
+    old, old_time = timed("pd.to_datetime", lambda s: pd.to_datetime(s, format="%d/%m/%Y"), dates)
+    new, new_time = timed("parse_date", br_parsers.parse_date, dates)
+    assert old.equals(new)
+    print(f"speedup {old_time / new_time:.1f}x")
+
+    old, old_time = timed("apply(dob_to_int)", lambda s: s.apply(dob_to_int), dates)
+    new, new_time = timed("date_to_int", br_parsers.date_to_int, dates)
+    assert (old.to_numpy() == new.to_numpy(dtype=np.int64)).all()
+    print(f"speedup {old_time / new_time:.1f}x")
+
+    # The replaced conversions only work without thousands separators
+    decimals = synthetic_decimals(args.rows, max_cents=100_000)
+    print(f"{args.rows} decimals below 1.000,00")
+    old, old_time = timed("apply(float(replace))", lambda s: s.apply(lambda x: float(x.replace(",", "."))), decimals)
+    old, old_time = timed(".str.replace.astype(float)", lambda s: s.str.replace(",", ".").astype(float), decimals)
+    new, new_time = timed("parse_decimal", br_parsers.parse_decimal, decimals)
+    assert old.equals(new)
+    print(f"speedup {old_time / new_time:.1f}x")
+
+    decimals = synthetic_decimals(args.rows)
+    print(f"{args.rows} decimals up to 10.000.000,00")
+    timed("parse_decimal", br_parsers.parse_decimal, decimals)
+
+if __name__ == "__main__":
+    main()
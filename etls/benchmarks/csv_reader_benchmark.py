@@ -0,0 +1,94 @@
+"""
+Compares csv_reader with pandas' C engine on a Portal da Transparência file.
+
+    python benchmarks/csv_reader_benchmark.py https://portaldatransparencia.gov.br/download-de-dados/bpc/202401
+    python benchmarks/csv_reader_benchmark.py ~/Downloads/202401_BPC.zip
+
+Each reader runs in a fresh process, so the peak RSS reported is its own.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import csv_reader  # noqa: E402
+
+DICTIONARY_COLUMNS = ["UF", "NOME MUNICÍPIO", "CÓDIGO MUNICÍPIO SIAFI"]
+
+
+def read_pandas(member):
+    return pd.read_csv(member, sep=";", encoding="iso-8859-1", dtype=str)
+
+
+def read_arrow(member):
+    return csv_reader.read_csv(member)
+
+
+def read_arrow_dictionary(member):
+    return csv_reader.read_csv(member, dictionary_columns=DICTIONARY_COLUMNS)
+
+
+def read_arrow_auto_dictionary(member):
+    return csv_reader.read_csv(member, auto_dictionary=True)
+
+
+READERS = {
+    "pandas c engine, object": read_pandas,
+    "arrow, string[pyarrow]": read_arrow,
+    "arrow, UF/município categorical": read_arrow_dictionary,
+    "arrow, auto categorical": read_arrow_auto_dictionary,
+}
+
+
+def measure(name, path, queue):
+    with ZipFile(path) as z, z.open(z.namelist()[0]) as member:
+        start = time.perf_counter()
+        df = READERS[name](member)
+        seconds = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    queue.put((seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, df.memory_usage(deep=True).sum() / 2**20, len(df)))
+
+
+def download(url):
+    import http_client
+
+    f = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    with http_client.get(url, stream=True) as r:
+        r.raise_for_status()
+        shutil.copyfileobj(r.raw, f)
+    f.close()
+    return f.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="URL or path of a zipped portal CSV")
+    args = parser.parse_args()
+
+    path = download(args.source) if args.source.startswith("http") else args.source
+    context = multiprocessing.get_context("spawn")
+
+    print(f"{'reader':34} {'rows':>10} {'parse s':>8} {'peak RSS MiB':>13} {'frame MiB':>10}")
+    for name in READERS:
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(name, path, queue))
+        process.start()
+        seconds, peak, frame, rows = queue.get()
+        process.join()
+        print(f"{name:34} {rows:>10} {seconds:>8.2f} {peak:>13.0f} {frame:>10.0f}")
+
+    if path != args.source:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
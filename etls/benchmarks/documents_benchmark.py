@@ -0,0 +1,74 @@
+"""
+Compares the documents kernel with the per-row cleaning it replaced (chained
+str.replace, then zfill), on a synthetic column of formatted CPFs, both as
+Python objects and as the string[pyarrow] column csv_reader returns. The kernel
+also validates the check digits, and must match the chain's output and beat its
+speed.
+
+    python benchmarks/documents_benchmark.py --rows 5000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import documents  # noqa: E402
+
+
+def synthetic_cpfs(rows: int, seed: int = 0) -> pd.Series:
+    """
+    `rows` CPFs formatted as 000.000.000-00, about one in eleven with valid
+    check digits
+    """
+    rng = np.random.default_rng(seed)
+    numbers = rng.integers(0, 10 ** 11, rows)
+    return pd.Series(
+        np.array([f"{n // 10 ** 8:03d}.{n // 10 ** 5 % 1000:03d}.{n // 100 % 1000:03d}-{n % 100:02d}" for n in numbers], dtype=object)
+    )
+
+
+def per_row(series: pd.Series) -> pd.Series:
+    return series.str.replace(".", "").str.replace("-", "").str.replace("/", "").str.zfill(11)
+
+
+def kernel(series: pd.Series) -> pd.Series:
+    cleaned, valid = documents.clean_cpf(series)
+    return cleaned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    objects = synthetic_cpfs(args.rows)
+    print(f"{args.rows} CPFs")
+
+    for dtype in [object, pd.StringDtype("pyarrow")]:
+        series = objects.astype(dtype)
+        print(f"{series.dtype} column")
+
+        timings = {}
+        results = {}
+        for name, function in [
+            (".str chain", per_row),
+            ("only_digits", documents.only_digits),
+            ("clean_cpf", kernel),
+        ]:
+            start = time.perf_counter()
+            results[name] = function(series)
+            timings[name] = time.perf_counter() - start
+            print(f"  {name:12} {timings[name]:8.2f}s {args.rows / timings[name] / 1e6:6.2f}M documents/s")
+
+        for name in ["only_digits", "clean_cpf"]:
+            assert results[".str chain"].equals(results[name]), name
+            assert timings[name] < timings[".str chain"], f"{name} is not faster than the .str chain"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares text_normalization with the per-row chain of .str methods it replaced
+on the text columns of a beneficiary file.
+
+    python benchmarks/text_normalization_benchmark.py https://portaldatransparencia.gov.br/download-de-dados/bpc/202401
+    python benchmarks/text_normalization_benchmark.py ~/Downloads/202401_BPC.zip
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import csv_reader  # noqa: E402
+import text_normalization  # noqa: E402
+
+# Text columns normalized by the beneficios_sociais transforms
+COLUMNS = ["NOME MUNICÍPIO", "NOME FAVORECIDO", "NOME BENEFICIÁRIO", "NOME REPRESENTANTE LEGAL"]
+
+
+def normalize_per_row(series: pd.Series) -> pd.Series:
+    return (
+        series.str.strip()
+        .str.upper()
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("utf-8")
+    )
+
+
+def download(url):
+    import http_client
+
+    f = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    with http_client.get(url, stream=True) as r:
+        r.raise_for_status()
+        shutil.copyfileobj(r.raw, f)
+    f.close()
+    return f.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="URL or path of a zipped beneficiary file")
+    args = parser.parse_args()
+
+    path = download(args.source) if args.source.startswith("http") else args.source
+    with ZipFile(path) as z, z.open(z.namelist()[0]) as member:
+        # object columns, as the transforms saw them before csv_reader
+        df = csv_reader.to_object_columns(csv_reader.read_csv(member, columns=COLUMNS))
+    if path != args.source:
+        os.remove(path)
+
+    print(f"{'column':26} {'rows':>10} {'distinct':>10} {'per row s':>10} {'factorized s':>13} {'speedup':>8}")
+    for column in df.columns:
+        series = df[column]
+
+        start = time.perf_counter()
+        expected = normalize_per_row(series)
+        per_row = time.perf_counter() - start
+
+        text_normalization.normalize_str.cache_clear()
+        start = time.perf_counter()
+        result = text_normalization.normalize_str_series(series)
+        factorized = time.perf_counter() - start
+
+        assert (result.fillna("") == expected.fillna("")).all(), column
+        print(
+            f"{column:26} {len(series):>10} {series.nunique():>10} {per_row:>10.2f} {factorized:>13.2f} "
+            f"{per_row / factorized:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Compares the column-level operations of the TSE pipeline with the row-wise
+applies they replaced, on a full-year donations file or, without one, on a
+synthetic frame of the same shape.
+
+    python benchmarks/tse_applies_benchmark.py --zip data/raw/prestacao_de_contas_eleitorais_candidatos_2022.zip --year 2022
+    python benchmarks/tse_applies_benchmark.py --rows 3000000
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tse"))
+
+import utils  # noqa: E402
+
+STATES = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI',
+          'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO', 'BR']
+COLS = ['NR_CPF_CNPJ_DOADOR', 'NM_DOADOR', 'NM_DOADOR_RFB', 'NR_CPF_CANDIDATO', 'DS_CARGO', 'SG_PARTIDO']
+
+
+def donations_file(path: str, year: int) -> pd.DataFrame:
+    zip_file = zipfile.ZipFile(path)
+    states = [uf for uf in STATES if f'receitas_candidatos_{year}_{uf}.csv' in zip_file.namelist()]
+    return utils.load_zipped_input_files(zip_file, f'receitas_candidatos_{year}' + '_{}.csv', states, COLS, cache_dir=None)
+
+
+def synthetic_donations(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    names = np.array([f"DOADOR {i}" for i in range(rows // 10 + 1)], dtype=object)
+    rfb_names = names.copy()
+    rfb_names[::3] = None
+    rfb_names[1::7] = ''
+    picks = rng.integers(0, len(names), rows)
+    cpfs = np.array([f"{n:09d}" for n in rng.integers(0, 10 ** 9, rows // 20 + 1)] + ['000000000-4'], dtype=object)
+    return pd.DataFrame({
+        'NM_DOADOR': names[picks],
+        'NM_DOADOR_RFB': rfb_names[picks],
+        'NR_CPF_CANDIDATO': cpfs[rng.integers(0, len(cpfs), rows)],
+        'DS_CARGO': rng.choice(np.array(['Deputado Federal', 'Deputado Estadual', 'Senador', 'Governador'], dtype=object), rows),
+        'SG_PARTIDO': rng.choice(np.array(['PT', 'PL', 'MDB', 'PATRIOTA', 'UNIÃO'], dtype=object), rows),
+    })
+
+
+def donor_name_per_row(df):
+    return df.apply(lambda x: x['NM_DOADOR'] if pd.isna(x['NM_DOADOR_RFB']) or x['NM_DOADOR_RFB'] == ''
+                    else x['NM_DOADOR_RFB'], axis=1)
+
+
+def donor_name(df):
+    has_rfb_name = df['NM_DOADOR_RFB'].notna() & (df['NM_DOADOR_RFB'] != '')
+    return df['NM_DOADOR_RFB'].where(has_rfb_name, df['NM_DOADOR'])
+
+
+def party_per_row(df):
+    conversion_dict = {'PATRIOTA': 'PATRI'}
+    return df['SG_PARTIDO'].apply(lambda x: conversion_dict[x] if x in list(conversion_dict) else x)
+
+
+def party(df):
+    return utils.party_name_conversion(df.rename(columns={'SG_PARTIDO': 'partido'}))['partido']
+
+
+def cpf_per_row(df):
+    cpf = df['NR_CPF_CANDIDATO'].str.zfill(11)
+    return cpf.apply(lambda x: None if x == '000000000-4' else x)
+
+
+def cpf(df):
+    return utils.adjust_cpf(df[['NR_CPF_CANDIDATO']].copy(), cpf_col='NR_CPF_CANDIDATO')['NR_CPF_CANDIDATO']
+
+
+def cargo_per_row(df):
+    return df['DS_CARGO'].apply(lambda x: x.upper())
+
+
+def cargo(df):
+    return utils.map_distinct(df['DS_CARGO'], lambda values: values.str.upper())
+
+
+def truncate_per_row(df, size=12):
+    column = df['NM_DOADOR'].apply(lambda x: x.strip() if not pd.isna(x) else x)
+    return column.apply(lambda x: x[0:size - 2] + '..' if not pd.isna(x) and type(x) == str and len(x) > size else x)
+
+
+def truncate(df, size=12):
+    return utils.truncate_string_cols(df[['NM_DOADOR']].copy(), ['NM_DOADOR'], size)['NM_DOADOR']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zip", help="prestacao_de_contas_eleitorais_candidatos_<year>.zip")
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument("--rows", type=int, default=3_000_000, help="synthetic rows, without --zip")
+    args = parser.parse_args()
+
+    df = donations_file(args.zip, args.year) if args.zip else synthetic_donations(args.rows)
+    print(f"{len(df)} donations")
+
+    total_old = total_new = 0
+    for name, old, new in [
+        ("donor name fallback", donor_name_per_row, donor_name),
+        ("party conversion", party_per_row, party),
+        ("adjust_cpf", cpf_per_row, cpf),
+        ("cargo upper", cargo_per_row, cargo),
+        ("truncate_string_cols", truncate_per_row, truncate),
+    ]:
+        start = time.perf_counter()
+        expected = old(df)
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = new(df)
+        new_time = time.perf_counter() - start
+        assert expected.fillna('').astype(str).equals(result.fillna('').astype(str)), name
+        total_old += old_time
+        total_new += new_time
+        print(f"{name:22} {old_time:8.2f}s -> {new_time:6.2f}s ({old_time / new_time:.0f}x)")
+    print(f"{'total':22} {total_old:8.2f}s -> {total_new:6.2f}s ({total_old / total_new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
-from typing import Dict
+from typing import Dict, Iterator, List
 import pandas as pd
-import requests
-from io import BytesIO
+import http_client
+import csv_reader
+from br_parsers import decimal_text
+from text_normalization import normalize_str_series
+from zipfile import ZipFile
+import tempfile
 import random
 import sqlalchemy
 from google.cloud import bigquery
@@ -17,8 +21,141 @@ COLUMN_ORDER = [
             "valor_parcela",
         ]
 
-def reorder_columns(df: pd.DataFrame) -> pd.DataFrame:
-    return df[COLUMN_ORDER]
+# Default rows per chunk yielded by extract_file and loaded into the staging
+# table. Bounds the memory of a run regardless of the size of the month's files.
+CHUNK_SIZE = 500_000
+
+# Dataset of infofact.beneficios_sociais, where the staging table is created
+DATASET = "infofact"
+
+STAGING_SCHEMA = [
+    bigquery.SchemaField(column, "STRING") for column in COLUMN_ORDER + ["nome_beneficio"]
+]
+
+# Bytes requested from the portal per network read while downloading.
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
+def remove_document_punctuation(series: pd.Series) -> pd.Series:
+    return series.str.replace(".", "", regex=False).str.replace("-", "", regex=False)
+
+
+# Conversions applied from a source column to a target column in BENEFIT_SPECS
+CONVERSIONS = {
+    "copy": lambda series: series,
+    "year": lambda series: series.str[0:4],
+    "month": lambda series: series.str[4:6],
+    "document": remove_document_punctuation,
+    "decimal": decimal_text,
+    "name": lambda series: normalize_str_series(series, collapse_whitespace=True),
+    "name_or_empty": lambda series: normalize_str_series(series.fillna(""), collapse_whitespace=True),
+}
+
+# Per benefit: download path on the portal, name in infofact.beneficios_sociais,
+# (source column, target column, conversion) for every COLUMN_ORDER column the
+# file has (the others are left null), and source values whose rows are dropped.
+# Only the source columns listed here are parsed.
+BENEFIT_SPECS = {
+    "garantia_safra": {
+        "download": "garantia-safra",
+        "nome_beneficio": "Garantia Safra",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+    "peti": {
+        "download": "peti",
+        "nome_beneficio": "Programa de Erradicação do Trabalho Infantil",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name_or_empty"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+    "bpc": {
+        "download": "bpc",
+        "nome_beneficio": "Benefício de Prestação Continuada",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS BENEFICIÁRIO", "nis_beneficiario", "copy"),
+            ("CPF BENEFICIÁRIO", "cpf_beneficiario_anonimizado", "document"),
+            ("NOME BENEFICIÁRIO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+        "exclude": {
+            "NIS BENEFICIÁRIO": ["-1", "-3", "", "***Titular menor de 16 anos***", "99999990003"],
+        },
+    },
+    "bolsa_familia": {
+        "download": "bolsa-familia-pagamentos",
+        "nome_beneficio": "Bolsa família",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("CPF FAVORECIDO", "cpf_beneficiario_anonimizado", "document"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+    "seguro_defeso": {
+        "download": "seguro-defeso",
+        "nome_beneficio": "Seguro Defeso",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("CPF FAVORECIDO", "cpf_beneficiario_anonimizado", "document"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+    "auxilio_brasil": {
+        "download": "auxilio-brasil",
+        "nome_beneficio": "Auxílio Brasil",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("CPF FAVORECIDO", "cpf_beneficiario_anonimizado", "document"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+    "novo_bolsa_familia": {
+        "download": "novo-bolsa-familia",
+        "nome_beneficio": "Novo Bolsa Família",
+        # first month published, used until the benefit has rows in the table
+        "first_month": "202303",
+        "columns": [
+            ("MÊS REFERÊNCIA", "ano_referencia", "year"),
+            ("MÊS REFERÊNCIA", "mes_referencia", "month"),
+            ("NIS FAVORECIDO", "nis_beneficiario", "copy"),
+            ("CPF FAVORECIDO", "cpf_beneficiario_anonimizado", "document"),
+            ("NOME FAVORECIDO", "nome_beneficiario", "name"),
+            ("VALOR PARCELA", "valor_parcela", "decimal"),
+        ],
+    },
+}
+
+
+def source_columns(benefit: str) -> List[str]:
+    spec = BENEFIT_SPECS[benefit]
+    columns = [source for source, _, _ in spec["columns"]] + list(spec.get("exclude", {}))
+    return list(dict.fromkeys(columns))
+
+def bigquery_client() -> bigquery.Client:
+    # project and credentials come from the environment
+    return bigquery.Client()
+
+def bigquery_engine():
+    return sqlalchemy.create_engine(f"bigquery://{bigquery_client().project}/{DATASET}")
 
 def get_next_year_month_beneficios_table() -> Dict[str, str]:
     """
@@ -39,416 +176,148 @@ def get_next_year_month_beneficios_table() -> Dict[str, str]:
 
     return data
 
-def extract_file(specific_set, yearmonth):
-    specific_set_mapper = {
-        "garantia_safra": "garantia-safra",
-        "peti": "peti",
-        "bpc": "bpc",
-        "bolsa_familia": "bolsa-familia-pagamentos",
-        "seguro_defeso": "seguro-defeso",
-        "auxilio_brasil": "auxilio-brasil",
-        "novo_bolsa_familia": "novo-bolsa-familia",
-    }
-
+def extract_file(specific_set, yearmonth, chunksize=CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Streams the benefit file for the given month, yielding frames of about `chunksize` rows with only the columns its spec uses. Yields nothing if the file isn't published yet.
+    """
     base_download_URL = "https://www.portaltransparencia.gov.br/download-de-dados"
 
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
-    download_URL = f"{base_download_URL}/{specific_set_mapper[specific_set]}/{yearmonth}"
-    r = requests.get(download_URL, headers=headers)
+    download_URL = f"{base_download_URL}/{BENEFIT_SPECS[specific_set]['download']}/{yearmonth}"
+    r = http_client.get(download_URL, headers=headers, stream=True)
 
     if r.status_code != 200:
         print("File doesn't exist yet on Portal da Transparencia")
-        return pd.DataFrame()
-
-    return pd.read_csv(
-        BytesIO(r.content),
-        dtype=str,
-        encoding="ISO-8859-1",
-        sep=";",
-        compression="zip",
-    )
-
-def transform_bpc(df: pd.DataFrame) -> pd.DataFrame:
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-
-    df = df.rename(
-        columns={
-            "UF": "estado",
-            "NOME MUNICÍPIO": "municipio",
-            "CÓDIGO MUNICÍPIO SIAFI": "codigo_municipio_siafi",
-            "NIS BENEFICIÁRIO": "nis_beneficiario",
-            "CPF BENEFICIÁRIO": "cpf_beneficiario_anonimizado",
-            "NOME BENEFICIÁRIO": "nome_beneficiario",
-            "NIS REPRESENTANTE LEGAL": "nis_representante_legal",
-            "CPF REPRESENTANTE LEGAL": "cpf_representante_legal",
-            "NOME REPRESENTANTE LEGAL": "nome_representante_legal",
-            "BENEFÍCIO CONCEDIDO JUDICIALMENTE": "beneficio_concedido_judicialmente",
-            "VALOR PARCELA": "valor_parcela",
-        }
-    ).filter(
-        items=[
-            "ano_referencia",
-            "mes_referencia",
-            "estado",
-            "municipio",
-            "codigo_municipio_siafi",
-            "nis_beneficiario",
-            "cpf_beneficiario_anonimizado",
-            "nome_beneficiario",
-            "nis_representante_legal",
-            "cpf_representante_legal",
-            "nome_representante_legal",
-            "beneficio_concedido_judicialmente",
-            "valor_parcela",
-        ]
-    )
-
-    df = df[
-        ~df["nis_beneficiario"].isin(
-            ["-1", "-3", "", "***Titular menor de 16 anos***", "99999990003"]
-        )
-    ]
-
-    df["cpf_beneficiario_anonimizado"] = (
-        df["cpf_beneficiario_anonimizado"]
-        .str.replace(".", "", regex=False)
-            .str.replace("-", "", regex=False)
-    )
-
-    df["beneficio_concedido_judicialmente"] = df[
-        "beneficio_concedido_judicialmente"
-    ].map({"Sim": True, "Não": False})
-
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
-
-    df["nome_beneficiario"] = df["nome_beneficiario"].apply(
-        lambda x: " ".join(x.split())
-    )
-
-    cols = ["nome_beneficiario", "municipio"]
-
-    for col in cols:
-        df[col] = (
-            df[col]
-            .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
-
-    return reorder_columns(df)
-
-def transform_garantia_safra(df: pd.DataFrame) -> pd.DataFrame:
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-
-    df = df.rename(
-        columns={
-            "UF": "estado",
-            "NOME MUNICÍPIO": "municipio",
-            "CÓDIGO MUNICÍPIO SIAFI": "codigo_municipio_siafi",
-            "NIS FAVORECIDO": "nis_beneficiario",
-            "NOME FAVORECIDO": "nome_beneficiario",
-            "VALOR PARCELA": "valor_parcela",
-        }
-    ).filter(
-        items=[
-            "ano_referencia",
-            "mes_referencia",
-            "estado",
-            "municipio",
-            "codigo_municipio_siafi",
-            "nis_beneficiario",
-            "nome_beneficiario",
-            "valor_parcela",
-        ]
-    )
-
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
-
-    df["nome_beneficiario"] = df["nome_beneficiario"].apply(
-        lambda x: " ".join(x.split())
-    )
-
-    cols = ["nome_beneficiario", "municipio"]
-
-    for col in cols:
-        df[col] = (
-            df[col]
-            .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
-
-    return reorder_columns(df)
-def transform_peti(df: pd.DataFrame) -> pd.DataFrame:
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-
-    df = df.rename(
-        columns={
-            "UF": "estado",
-            "NOME MUNICÍPIO": "municipio",
-            "CÓDIGO MUNICÍPIO SIAFI": "codigo_municipio_siafi",
-            "NIS FAVORECIDO": "nis_beneficiario",
-            "NOME FAVORECIDO": "nome_beneficiario",
-            "VALOR PARCELA": "valor_parcela",
-        }
-    ).filter(
-        items=[
-            "ano_referencia",
-            "mes_referencia",
-            "estado",
-            "municipio",
-            "codigo_municipio_siafi",
-            "nis_beneficiario",
-            "nome_beneficiario",
-            "valor_parcela",
-        ]
-    )
-
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
+        return
 
-    df["nome_beneficiario"] = (
-        df["nome_beneficiario"].fillna("").apply(lambda x: " ".join(x.split()))
-    )
+    # The zip is written to disk in blocks instead of being held in memory, and
+    # only the CSV member stream is decompressed while it is parsed.
+    with tempfile.TemporaryFile() as f:
+        for block in r.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+            f.write(block)
+        f.seek(0)
 
-    cols = ["nome_beneficiario", "municipio"]
+        with ZipFile(f) as z, z.open(z.namelist()[0]) as member:
+            yield from csv_reader.iter_csv(member, chunksize, columns=source_columns(specific_set))
 
-    for col in cols:
-        df[col] = (
-            df[col]
-            .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
+def transform(df: pd.DataFrame, benefit: str) -> pd.DataFrame:
+    """
+    Builds the COLUMN_ORDER frame of a benefit from its source columns in a
+    single pass, as described by its BENEFIT_SPECS entry.
+    """
+    spec = BENEFIT_SPECS[benefit]
 
-    return reorder_columns(df)
-
-def transform_seguro_defeso(df: pd.DataFrame) -> pd.DataFrame:
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-
-    df = df.rename(
-        columns={
-            "UF": "estado",
-            "NOME MUNICÍPIO": "municipio",
-            "CÓDIGO MUNICÍPIO SIAFI": "codigo_municipio_siafi",
-            "NIS FAVORECIDO": "nis_beneficiario",
-            "CPF FAVORECIDO": "cpf_beneficiario_anonimizado",
-            "RGP FAVORECIDO": "rgp_beneficiario",
-            "NOME FAVORECIDO": "nome_beneficiario",
-            "VALOR PARCELA": "valor_parcela",
-        }
-    ).filter(
-        items=[
-            "ano_referencia",
-            "mes_referencia",
-            "estado",
-            "municipio",
-            "codigo_municipio_siafi",
-            "nis_beneficiario",
-            "cpf_beneficiario_anonimizado",
-            "rgp_beneficiario",
-            "nome_beneficiario",
-            "valor_parcela",
-        ]
-    )
+    for source, values in spec.get("exclude", {}).items():
+        df = df[~df[source].isin(values)]
 
-    df["cpf_beneficiario_anonimizado"] = (
-        df["cpf_beneficiario_anonimizado"]
-        .str.replace(".", "", regex=False)
-            .str.replace("-", "", regex=False)
+    converted = {
+        target: CONVERSIONS[conversion](df[source]) for source, target, conversion in spec["columns"]
+    }
+    return pd.DataFrame(
+        {column: converted.get(column) for column in COLUMN_ORDER},
+        index=df.index,
     )
 
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
 
-    df["nome_beneficiario"] = df["nome_beneficiario"].apply(
-        lambda x: " ".join(x.split())
-    )
+def transformed_chunks(next_months: Dict[str, str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Yields the transformed chunks of every benefit's next month, one at a time.
+    """
+    for benefit, spec in BENEFIT_SPECS.items():
+        print(benefit)
 
-    cols = ["nome_beneficiario", "municipio"]
+        if spec["nome_beneficio"] not in next_months and "first_month" in spec:
+            next_month = spec["first_month"]
+        else:
+            next_month = next_months[spec["nome_beneficio"]]
 
-    for col in cols:
-        df[col] = (
-            df[col]
-            .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
+        for df in extract_file(benefit, next_month, chunk_rows):
+            df = transform(df, benefit)
+            df["nome_beneficio"] = spec["nome_beneficio"]
+            yield df
+        print("Extracted")
 
-    return df
-
-def transform_bolsa_familia(df: pd.DataFrame) -> pd.DataFrame:
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-    df["ano_competencia"] = df["MÊS COMPETÊNCIA"].astype(str).str[0:4]
-    df["mes_competencia"] = df["MÊS COMPETÊNCIA"].astype(str).str[4:6]
-
-    df = df.rename(
-        columns={
-            "UF": "estado",
-            "NOME MUNICÍPIO": "municipio",
-            "CÓDIGO MUNICÍPIO SIAFI": "codigo_municipio_siafi",
-            "CPF FAVORECIDO": "cpf_beneficiario_anonimizado",
-            "NIS FAVORECIDO": "nis_beneficiario",
-            "NOME FAVORECIDO": "nome_beneficiario",
-            "VALOR PARCELA": "valor_parcela",
-        }
-    ).filter(
-        items=[
-            "ano_referencia",
-            "mes_referencia",
-            "ano_competencia",
-            "mes_competencia",
-            "estado",
-            "municipio",
-            "codigo_municipio_siafi",
-            "cpf_beneficiario_anonimizado",
-            "nis_beneficiario",
-            "nome_beneficiario",
-            "valor_parcela",
-        ]
-    )
 
-    df["cpf_beneficiario_anonimizado"] = (
-        df["cpf_beneficiario_anonimizado"]
-        .str.replace(".", "", regex=False)
-            .str.replace("-", "", regex=False)
+def create_staging_table(client: bigquery.Client) -> bigquery.Table:
+    """
+    Creates an empty table for this run's rows, dropped by BigQuery after a day
+    if the run does not get to delete it.
+    """
+    now = datetime.datetime.now(pytz.utc)
+    table = bigquery.Table(
+        f"{client.project}.{DATASET}.beneficios_sociais_tmp_{now:%Y%m%d%H%M%S}_{random.randint(0, 9999):04d}",
+        schema=STAGING_SCHEMA,
     )
+    table.expires = now + datetime.timedelta(days=1)
+    return client.create_table(table)
 
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
 
-    df["nome_beneficiario"] = df["nome_beneficiario"].apply(
-        lambda x: " ".join(x.split())
+def stage(client: bigquery.Client, table: bigquery.Table, chunks: Iterator[pd.DataFrame]) -> int:
+    """
+    Appends each chunk to the staging table as it arrives. Only one chunk is held
+    at a time; it is released once its load job finishes.
+    """
+    job_config = bigquery.LoadJobConfig(
+        schema=STAGING_SCHEMA,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
     )
+    rows = 0
+    for df in chunks:
+        client.load_table_from_dataframe(df, table, job_config=job_config).result()
+        rows += len(df)
+        # drop the reference before the generator builds the next chunk
+        del df
+    return rows
 
-    cols = ["nome_beneficiario", "municipio"]
-
-    for col in cols:
-        df[col] = (
-            df[col]
-            .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
-
-    return reorder_columns(df)
-def transform_auxilio_brasil(df):
-
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-    df.rename(columns={
-        "nome_municipio": "municipio",
-        "uf": "estado",
-    })
-
-    df["valor_parcela"] = df["valor_parcela"].str.replace(",", ".", regex=False)
-    df["cpf_beneficiario_anonimizado"] = df["cpf_favorecido"].str.replace(".", "", regex=False).str.replace("-", "", regex=False)
-    df["nome_beneficiario"] = (df["nome_favorecido"].str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8"))
-
-    return reorder_columns(df)
-
-def transform_novo_bolsa_familia(df):
-
-    df["ano_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[0:4]
-    df["mes_referencia"] = df["MÊS REFERÊNCIA"].astype(str).str[4:6]
-
-    df["valor_parcela"] = df["VALOR PARCELA"].str.replace(",", ".", regex=False)
-    df["cpf_beneficiario_anonimizado"] = df["CPF FAVORECIDO"].str.replace(".", "", regex=False).str.replace("-", "", regex=False)
-    df["nis_beneficiario"] = df["NIS FAVORECIDO"]
-    df["nome_beneficiario"] = (df["NOME FAVORECIDO"].str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8"))
-        
-    return reorder_columns(df)
-
-
-def run():
-    benefits = ["garantia_safra", "peti", "bpc", "bolsa_familia", "seguro_defeso", "auxilio_brasil", "novo_bolsa_familia"]
-    nome_beneficio = {
-        "garantia_safra": "Garantia Safra",
-        "peti": "Programa de Erradicação do Trabalho Infantil",
-        "bpc": "Benefício de Prestação Continuada",
-        "bolsa_familia": "Bolsa família",
-        "seguro_defeso": "Seguro Defeso",
-        "auxilio_brasil": "Auxílio Brasil",
-        "novo_bolsa_familia": "Novo Bolsa Família",
-    }
-
-    transform_funcs = {
-        "garantia_safra": transform_garantia_safra,
-        "peti": transform_peti,
-        "bpc": transform_bpc,
-        "bolsa_familia": transform_bolsa_familia,
-        "seguro_defeso": transform_seguro_defeso,
-        "auxilio_brasil": transform_auxilio_brasil,
-        "novo_bolsa_familia": transform_novo_bolsa_familia,
-    }
 
+def run(chunk_rows: int = CHUNK_SIZE):
+    """
+    Streams every benefit's new month into a staging table, chunk by chunk, and
+    merges it into beneficios_sociais. Memory is bounded by `chunk_rows`
+    whatever the month's volume.
+    """
+    client = bigquery_client()
     next_months = get_next_year_month_beneficios_table()
 
-    new_dfs = [ ] 
-
-    for benefit in benefits:
-        print(benefit)
-        
-        if nome_beneficio[benefit] not in next_months and benefit == "novo_bolsa_familia":
-            next_month = "202303"
-        else:
-            next_month = next_months[nome_beneficio[benefit]]
-
-        df = extract_file(benefit, next_month)
-        print("Extracted")
-        if df.empty:
-            continue
-        df = transform_funcs[benefit](df) 
-        df["nome_beneficio"] = nome_beneficio[benefit]
-        new_dfs.append(df)
-
-    if not new_dfs:
-        print("No new data")
-        return
-    final_df = pd.concat(new_dfs)
-
-    print("Inserted records")
-
-    query = f"""
-    UPDATE beneficios_sociais
-    SET mes_ultimo_recebimento = ano_referencia || "-" || mes_referencia,
-    valor_ultima_parcela = valor_parcela 
-    FROM (SELECT nis_beneficiario, nome_beneficio, ano_referencia, mes_referencia, SUM(CAST(valor_parcela AS FLOAT64)) valor_parcela FROM .{tmp_table_def.table_id} GROUP BY nis_beneficiario, nome_beneficio, ano_referencia, mes_referencia) u
-    WHERE beneficios_sociais.nis_beneficiario = u.nis_beneficiario
-    AND beneficios_sociais.nome_beneficio = u.nome_beneficio;
-
-    INSERT INTO beneficios_sociais (nis_beneficiario, cpf_anonimizado, nome_beneficiario, nome_beneficio, mes_primeiro_recebimento, mes_ultimo_recebimento, valor_ultima_parcela) 
-    (
-        SELECT nis_beneficiario,
-               cpf_beneficiario_anonimizado,
-               nome_beneficiario,
-               nome_beneficio,
-               ano_referencia || "-" || mes_referencia AS mes_primeiro_recebimento,
-               ano_referencia || "-" || mes_referencia AS mes_ultimo_recebimento,
-               SUM(CAST(valor_parcela AS FLOAT64)) AS valor_parcela
-        FROM .{tmp_table_def.table_id}
-        GROUP BY nis_beneficiario, cpf_beneficiario_anonimizado, nome_beneficiario, nome_beneficio, mes_primeiro_recebimento, mes_ultimo_recebimento
-    )
+    tmp_table = create_staging_table(client)
+    try:
+        rows = stage(client, tmp_table, transformed_chunks(next_months, chunk_rows))
+        if not rows:
+            print("No new data")
+            return
+        print(f"Inserted {rows} records")
+
+        staging = f"`{tmp_table.project}.{tmp_table.dataset_id}.{tmp_table.table_id}`"
+        query = f"""
+        UPDATE beneficios_sociais
+        SET mes_ultimo_recebimento = ano_referencia || "-" || mes_referencia,
+        valor_ultima_parcela = valor_parcela 
+        FROM (SELECT nis_beneficiario, nome_beneficio, ano_referencia, mes_referencia, SUM(CAST(valor_parcela AS FLOAT64)) valor_parcela FROM {staging} GROUP BY nis_beneficiario, nome_beneficio, ano_referencia, mes_referencia) u
+        WHERE beneficios_sociais.nis_beneficiario = u.nis_beneficiario
+        AND beneficios_sociais.nome_beneficio = u.nome_beneficio;
+
+        INSERT INTO beneficios_sociais (nis_beneficiario, cpf_anonimizado, nome_beneficiario, nome_beneficio, mes_primeiro_recebimento, mes_ultimo_recebimento, valor_ultima_parcela) 
+        (
+            SELECT nis_beneficiario,
+                   cpf_beneficiario_anonimizado,
+                   nome_beneficiario,
+                   nome_beneficio,
+                   ano_referencia || "-" || mes_referencia AS mes_primeiro_recebimento,
+                   ano_referencia || "-" || mes_referencia AS mes_ultimo_recebimento,
+                   SUM(CAST(valor_parcela AS FLOAT64)) AS valor_parcela
+            FROM {staging}
+            GROUP BY nis_beneficiario, cpf_beneficiario_anonimizado, nome_beneficiario, nome_beneficio, mes_primeiro_recebimento, mes_ultimo_recebimento
+        )
 
-    """
-    _ = client.query_and_wait(query) 
-    print("Updated records")
+        """
+        job_config = bigquery.QueryJobConfig(default_dataset=f"{client.project}.{DATASET}")
+        _ = client.query_and_wait(query, job_config=job_config)
+        print("Updated records")
+    finally:
+        client.delete_table(tmp_table, not_found_ok=True)
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ if the current cookie is not valid.
 
 import boto3
 import json
-import requests
+import http_client
 import logging
 
 logging.getLogger().setLevel(logging.INFO)
@@ -60,7 +60,7 @@ def lambda_handler(event: dict, context) -> dict:
         "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36",
     }
 
-    response = requests.post(
+    response = http_client.post(
         "https://portalbnmp.cnj.jus.br/bnmpportal/api/pesquisa-pecas/filter?page=0&size=1&sort=numeroPeca,ASC",
         data='{"buscaOrgaoRecursivo":false,"orgaoExpeditor":{},"idEstado":1}',
         headers=headers,
@@ -8,6 +8,7 @@ import json
 import logging
 import requests
 
+import http_client
 from bnmp_utils import (
     config,
     define_payload,
@@ -17,6 +18,9 @@ from bnmp_utils import (
 
 cfg: dict = config()
 
+# One request in flight per worker thread, all to the same host
+http_client.configure(max_per_host=cfg["threads"]["max_workers"])
+
 if len(logging.getLogger().handlers) > 0:
     logging.getLogger().setLevel(logging.INFO)
 else:
@@ -55,7 +59,7 @@ class Mapper:
         """
         data: str = define_payload(api_map)
         url: str = cfg["url"]["base"].format(page=0, query_size=1, order="ASC")
-        response: requests.models.Response = requests.post(
+        response: requests.models.Response = http_client.post(
             url,
             data=data,
             headers=cfg["requests"]["headers"],
@@ -108,7 +112,7 @@ class Mapper:
             A generator containing ids of the cities in the state.
         """
         url: str = cfg["url"]["cities"].format(state=state_id)
-        response: requests.models.Response = requests.get(
+        response: requests.models.Response = http_client.get(
             url, headers=cfg["requests"]["headers"]
         )
         cities_json = json.loads(response.text)
@@ -127,7 +131,7 @@ class Mapper:
             header parameter.
         """
         url: str = cfg["url"]["agencies"].format(city=city_id)
-        response: requests.models.Response = requests.get(
+        response: requests.models.Response = http_client.get(
             url, headers=cfg["requests"]["headers"]
         )
         agencies_json: dict = json.loads(response.text)
@@ -6,12 +6,12 @@ Scraps warrants data from the BNMP API.
 import json
 import logging
 import redshift_connector
-import requests
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from concurrent.futures import as_completed, ThreadPoolExecutor
 from datetime import date, datetime
 from typing import Any, Dict, Generator, List, Literal, Set, Tuple, Union
 
+import http_client
 from bnmp_utils import (
     clean,
     config,
@@ -23,6 +23,9 @@ from bnmp_utils import (
 
 cfg: dict = config()
 
+# One request in flight per worker thread, all to the same host
+http_client.configure(max_per_host=cfg["threads"]["max_workers"])
+
 if len(logging.getLogger().handlers) > 0:
     logging.getLogger().setLevel(logging.INFO)
 else:
@@ -84,7 +87,7 @@ class BulkScraper:
         url: str = cfg["url"]["base"].format(
             page=page, query_size=2_000, order=order
         )
-        response = requests.post(
+        response = http_client.post(
             url,
             headers=json.loads(headers()),
             data=payload,
@@ -213,7 +216,7 @@ class DetailsScraper:
             Detailed data from warrant if it is filled with valid data.
         """
         details = json.loads(
-            requests.get(
+            http_client.get(
                 cfg["url"]["details"].format(id=item[0], type=item[1]),
                 headers=json.loads(headers()),
                 timeout=cfg["requests"]["timeout"],
@@ -297,7 +300,7 @@ class PDFsScraper:
             Tuple with the item id, item type and bytes representing the pdf of the warrant.
             If the API returns a status code different from 200, then None is returned.
         """
-        response = requests.post(
+        response = http_client.post(
             cfg["url"]["pdf"].format(id=item[0], type=item[1]),
             headers=json.loads(headers()),
             timeout=cfg["requests"]["timeout"],
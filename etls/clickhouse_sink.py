@@ -0,0 +1,226 @@
+"""
+Bulk loader for the ClickHouse data warehouse.
+
+A frame, or an iterator of frames, is inserted in blocks of a fixed number of
+rows, one INSERT per block. The driver then serializes one block at a time,
+and a failed block is retried on its own instead of losing the whole load.
+Blocks travel LZ4 compressed. With several streams, blocks are inserted by a
+thread pool, each stream on its own connection since a clickhouse-driver
+Client is not thread-safe.
+
+Full snapshots are loaded with `replace` or `replace_partitions`: the rows go
+to a staging table with the same structure, which is then swapped in
+atomically with EXCHANGE TABLES or ALTER TABLE REPLACE PARTITION. Readers see
+either the previous snapshot or the new one, never a half-loaded table, and
+the table holds a single snapshot instead of one per run.
+
+A retried block is sent again whole. If the server had already written it,
+the rows are duplicated unless the table deduplicates inserts (replicated
+tables, or non_replicated_deduplication_window).
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, Union
+
+import pandas as pd
+from clickhouse_driver import Client
+from clickhouse_driver.errors import NetworkError, SocketTimeoutError
+
+import csv_reader
+
+CONNECTION = dict(host="data-warehouse", user="admin", password="admin")
+
+# Rows per INSERT. Large enough for ClickHouse to write few parts, small enough
+# that a retry resends little and a block of wide rows stays in tens of MB.
+BLOCK_ROWS = 100_000
+
+RETRY_ERRORS = (NetworkError, SocketTimeoutError, EOFError, ConnectionError, TimeoutError)
+
+
+class ClickHouseSink:
+    def __init__(
+        self,
+        database: str,
+        table: str,
+        block_rows: int = BLOCK_ROWS,
+        streams: int = 1,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        compression: str = "lz4",
+        **connection,
+    ) -> None:
+        self.table = table
+        self.staging_table = f"{table}__staging"
+        self.block_rows = block_rows
+        self.streams = streams
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.connection = dict(CONNECTION, database=database, compression=compression, **connection)
+
+        self.rows = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._clients = []
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Client:
+        # Idle connections are reused across blocks and writes; each stream holds one at a time
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        client = Client(**self.connection)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def _release(self, client: Client) -> None:
+        with self._lock:
+            self._idle.append(client)
+
+    def _blocks(self, frames: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for df in frames:
+            for start in range(0, len(df), self.block_rows):
+                yield df.iloc[start:start + self.block_rows]
+
+    def _execute(self, query: str, params: dict = None):
+        client = self._acquire()
+        try:
+            return client.execute(query, params)
+        finally:
+            self._release(client)
+
+    def _create_staging(self) -> None:
+        # Left over by an interrupted run, if it exists
+        self._execute(f'DROP TABLE IF EXISTS "{self.staging_table}"')
+        self._execute(f'CREATE TABLE "{self.staging_table}" AS "{self.table}"')
+
+    def _insert(self, query: str, block: pd.DataFrame) -> None:
+        # Text and categorical columns go back to object arrays, one block at a time
+        block = csv_reader.to_object_columns(block)
+        client = self._acquire()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    client.insert_dataframe(query, block, settings=dict(use_numpy=True))
+                    break
+                except RETRY_ERRORS:
+                    client.disconnect()
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(random.uniform(0, self.backoff * 2**attempt))
+            # Bytes as written by the server, before compression
+            progress = client.last_query.progress
+        finally:
+            self._release(client)
+
+        with self._lock:
+            self.rows += len(block)
+            self.bytes += progress.written_bytes if progress else 0
+
+    def write(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], table: str = None) -> int:
+        """
+        Inserts a frame or every frame of an iterator, returning the number of
+        rows inserted. Raises the first insert error once retries run out.
+        """
+        query = f'INSERT INTO "{table or self.table}" VALUES'
+        frames = [data] if isinstance(data, pd.DataFrame) else data
+        rows, start = self.rows, time.perf_counter()
+
+        if self.streams == 1:
+            for block in self._blocks(frames):
+                self._insert(query, block)
+        else:
+            # At most two blocks per stream are in flight, so a large iterator
+            # is never materialized ahead of the inserts
+            with ThreadPoolExecutor(max_workers=self.streams) as executor:
+                pending = set()
+                for block in self._blocks(frames):
+                    if len(pending) >= 2 * self.streams:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(executor.submit(self._insert, query, block))
+                for future in pending:
+                    future.result()
+
+        self.seconds += time.perf_counter() - start
+        self.print_stats()
+        return self.rows - rows
+
+    def replace(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> int:
+        """
+        Replaces the whole table with a snapshot: loads it into the staging
+        table and swaps the two with EXCHANGE TABLES. Nothing changes if the
+        load fails.
+        """
+        self._create_staging()
+        try:
+            rows = self.write(data, table=self.staging_table)
+            self._execute(f'EXCHANGE TABLES "{self.table}" AND "{self.staging_table}"')
+        finally:
+            # After the exchange the staging table holds the previous snapshot
+            self._execute(f'DROP TABLE IF EXISTS "{self.staging_table}"')
+        return rows
+
+    def _partition_key(self) -> str:
+        rows = self._execute(
+            "SELECT partition_key FROM system.tables WHERE database = currentDatabase() AND name = %(table)s",
+            {"table": self.table},
+        )
+        partition_key = rows[0][0] if rows else ""
+        if not partition_key:
+            # The staging table copies the live one, and REPLACE PARTITION of an
+            # unpartitioned table would move the whole table at once
+            raise RuntimeError(
+                f"{self.table} is not partitioned: migrate it to its PARTITION BY (see ddls/migrations) first"
+            )
+        return partition_key
+
+    def replace_partitions(
+        self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], partitions: Iterable[str] = ()
+    ) -> int:
+        """
+        Replaces only the partitions present in a snapshot, e.g. one source of
+        a table partitioned by source: loads it into the staging table and
+        moves each of its partitions in with REPLACE PARTITION. Other
+        partitions are kept.
+
+        `partitions` lists the values of the partition key the snapshot stands
+        for. Those that come back without rows are dropped, so a source whose
+        new snapshot is empty does not keep its old rows. Raises before
+        loading if the table is not partitioned.
+        """
+        partition_key = self._partition_key()
+        self._create_staging()
+        try:
+            rows = self.write(data, table=self.staging_table)
+            staged = self._execute(
+                f'SELECT DISTINCT _partition_id, toString({partition_key}) FROM "{self.staging_table}"'
+            )
+            for partition_id, _ in staged:
+                self._execute(
+                    f"ALTER TABLE \"{self.table}\" REPLACE PARTITION ID '{partition_id}' FROM \"{self.staging_table}\""
+                )
+            for value in set(partitions) - {value for _, value in staged}:
+                print(f"{self.table}: no rows for partition {value}, dropping it")
+                self._execute(f'ALTER TABLE "{self.table}" DROP PARTITION %(value)s', {"value": value})
+        finally:
+            self._execute(f'DROP TABLE IF EXISTS "{self.staging_table}"')
+        return rows
+
+    def print_stats(self) -> None:
+        seconds = max(self.seconds, 1e-9)
+        print(
+            f"{self.table}: {self.rows} rows in {self.seconds:.1f}s, "
+            f"{self.rows / seconds:,.0f} rows/s, {self.bytes / seconds / 1e6:.1f} MB/s"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients:
+                client.disconnect()
+            self._clients = []
+            self._idle = []
@@ -0,0 +1,125 @@
+"""
+Cache of parsed COAF decisions, kept as a single JSON document in the data lake.
+
+Entries are keyed by decision link and hold the page's ETag and Last-Modified,
+fingerprints of its raw body and of its content, and the parsed record. When
+the portal does not answer a conditional GET with 304, a body identical byte for
+byte is recognised before it is parsed. A decision is reparsed only when the
+page changed and its content differs from the cached fingerprint (a page whose
+markup changes around the same decision).
+"""
+import hashlib
+import json
+import threading
+
+from botocore.exceptions import ClientError
+
+from artifact_cache import DATA_LAKE_BUCKET, data_lake_client
+
+CACHE_KEY = "cache/coaf/decisoes.json"
+
+
+def fingerprint(*parts) -> str:
+    """Hash of text or bytes parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else (part or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DecisionCache:
+    def __init__(self, bucket: str = DATA_LAKE_BUCKET, key: str = CACHE_KEY) -> None:
+        self.bucket = bucket
+        self.key = key
+        self.s3 = data_lake_client()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self) -> "DecisionCache":
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "NoSuchBucket", "404"):
+                return self
+            raise
+        self.entries = json.loads(response["Body"].read())
+        return self
+
+    def validators(self, link: str) -> dict:
+        """
+        Conditional request headers for a cached decision page
+        """
+        entry = self.entries.get(link, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get(self, link: str, page_fingerprint: str = None):
+        """
+        Cached record of a decision, if there is one and (when given) its
+        fingerprint still matches the page
+        """
+        entry = self.entries.get(link)
+        if entry is None or (page_fingerprint is not None and entry["fingerprint"] != page_fingerprint):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry["record"]
+
+    def get_unchanged(self, link: str, body_fingerprint: str, etag: str = None, last_modified: str = None):
+        """
+        Cached record of a decision whose page came back byte for byte the same,
+        so it need not be parsed. Refreshes the stored validators.
+        """
+        entry = self.entries.get(link)
+        if entry is None or entry.get("body_fingerprint") != body_fingerprint:
+            return None
+        with self._lock:
+            self.hits += 1
+        self.put(link, entry["record"], entry["fingerprint"], etag, last_modified, body_fingerprint)
+        return entry["record"]
+
+    def put(
+        self,
+        link: str,
+        record: dict,
+        page_fingerprint: str,
+        etag: str = None,
+        last_modified: str = None,
+        body_fingerprint: str = None,
+    ) -> None:
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fingerprint": page_fingerprint,
+            "body_fingerprint": body_fingerprint,
+            "record": record,
+        }
+        with self._lock:
+            if self.entries.get(link) != entry:
+                self.entries[link] = entry
+                self._dirty = True
+
+    def save(self) -> None:
+        print(f"Decision cache: {self.hits} reused, {self.misses} parsed")
+        if not self._dirty:
+            return
+        body = json.dumps(self.entries).encode()
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchBucket":
+                raise
+            # A fresh MinIO volume starts without buckets
+            self.s3.create_bucket(Bucket=self.bucket)
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body)
+        self._dirty = False
@@ -2,33 +2,110 @@ import numpy as np
 import pandas as pd
 import datetime
 from utils import *
-from loader import Loader
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-
-def fetch_links(start_index=0):
-    links = []
-    while True:
-        url = f"https://www.gov.br/coaf/pt-br/assuntos/processo-administrativo-sancionador-pas/ementario-de-decisoes?b_start:int={start_index}"
-        tree = get_html_tree(url)
-        elements = extract_elements(
-            tree,
-            "//*[contains(concat(' ', normalize-space(@class), ' '), ' tileHeadline ')]",
-        )
-        if not elements:
-            break
-        for element in elements:
-            links.append(element.getchildren()[0].get("href"))
-        start_index += 5
-    return links
-
-
-def process_link(link):
-    tree = get_html_tree(link)
-    if tree is None:
+from br_parsers import parse_date
+from cache import DecisionCache, fingerprint
+from documents import only_digits
+from loader import Loader, loaded_processos
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+
+LISTING_URL = "https://www.gov.br/coaf/pt-br/assuntos/processo-administrativo-sancionador-pas/ementario-de-decisoes"
+PAGE_SIZE = 5
+PAGE_WORKERS = 8
+DETAIL_WORKERS = 10
+
+
+def listing_url(page):
+    return f"{LISTING_URL}?b_start:int={page * PAGE_SIZE}"
+
+
+def page_links(tree):
+    elements = extract_elements(
+        tree,
+        "//*[contains(concat(' ', normalize-space(@class), ' '), ' tileHeadline ')]",
+    )
+    return [element.getchildren()[0].get("href") for element in elements]
+
+
+def get_listing_tree(page):
+    """
+    Listing page `page`. Unlike get_html_tree, a failed request raises once the
+    client's retries are exhausted: an empty page ends the crawl, so a page that
+    did not load must not be taken for one.
+    """
+    response = http_client.get(listing_url(page))
+    response.raise_for_status()
+    return parse_html(response.text)
+
+
+def fetch_page(page):
+    return page_links(get_listing_tree(page))
+
+
+def numero_processo_from_link(link):
+    return "".join([x for x in link.split("/")[-1] if x.isnumeric()])
+
+
+def count_pages(first_page_tree=None):
+    """
+    Number of listing pages. Starts from the highest b_start in the pagination
+    bar, then probes pages at doubling offsets and binary searches for the last
+    non-empty one.
+    """
+    tree = first_page_tree if first_page_tree is not None else get_listing_tree(0)
+    if not page_links(tree):
+        return 0
+
+    starts = [
+        int(match)
+        for href in extract_elements(tree, "//a/@href")
+        for match in re.findall(r"b_start:int=(\d+)", href)
+    ]
+    # The bar may only link to nearby pages, or be stale if decisions were
+    # published meanwhile, so its last page is a lower bound to probe from
+    low = max(starts) // PAGE_SIZE if starts else 0
+    step = 1
+    while fetch_page(low + step):
+        low += step
+        step *= 2
+    high = low + step
+    # page `low` has links, page `high` is empty
+    while high - low > 1:
+        middle = (low + high) // 2
+        if fetch_page(middle):
+            low = middle
+        else:
+            high = middle
+    return low + 1
+
+
+def process_link(link, cache=None):
+    """
+    Parses a decision page. With a `cache`, the page is requested conditionally
+    and the cached record is returned when it did not change: on a 304, on a
+    body identical to the cached one (before parsing it), or on a page whose
+    content is the same.
+    """
+    headers = cache.validators(link) if cache is not None else {}
+    try:
+        response = http_client.get(link, headers=headers)
+        if response.status_code == 304:
+            return cache.get(link)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Error fetching URL {link}: {e}")
         return None
 
-    numero_processo = "".join([x for x in link.split("/")[-1] if x.isnumeric()])
+    if cache is not None:
+        validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        body_fingerprint = fingerprint(response.content)
+        record = cache.get_unchanged(link, body_fingerprint, *validators)
+        if record is not None:
+            return record
+
+    tree = parse_html(response.text)
+
+    numero_processo = numero_processo_from_link(link)
     interessados = extract_elements(
         tree,
         "//*[contains(concat(' ', normalize-space(@class), ' '), ' documentDescription ')]",
@@ -42,6 +119,14 @@ def process_link(link):
             )[0].itertext()
         ]
     )
+
+    if cache is not None:
+        page_fingerprint = fingerprint(interessados, html_text)
+        record = cache.get(link, page_fingerprint)
+        if record is not None:
+            cache.put(link, record, page_fingerprint, *validators, body_fingerprint)
+            return record
+
     decisao_start = html_text.find("DECISÃO")
     date_pattern = r"\b\d{1,2}/\d{1,2}/\d{4}\b"
 
@@ -52,45 +137,96 @@ def process_link(link):
     else:
         data_julgamento = np.nan
 
-    return {
+    record = {
         "link": link,
         "numero_processo": numero_processo,
         "interessados": interessados,
+        "documento_interessado": find_cpf_in_string(interessados) + find_cnpj_in_string(interessados),
         "decisao": html_text[decisao_start:],
         "data_julgamento": data_julgamento,
     }
+    if cache is not None:
+        cache.put(link, record, page_fingerprint, *validators, body_fingerprint)
+    return record
+
 
+def crawl(known_processos=None, cache=None, page_workers=PAGE_WORKERS, detail_workers=DETAIL_WORKERS):
+    """
+    Fetches listing pages concurrently and hands each discovered link to the
+    detail-page pool as soon as its page arrives, instead of waiting for the
+    whole listing. Unchanged decisions are reused from `cache` when given.
+
+    With `known_processos` (incremental mode) decisions already loaded are
+    skipped, and since the listing is ordered from newest to oldest no page
+    after the first one containing a known decision is requested.
+    """
+    first_page = get_listing_tree(0)
+    total_pages = count_pages(first_page)
+    incremental = known_processos is not None
+    known_processos = known_processos or set()
 
-def process_links_parallel(links, max_workers=10):
     data = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_link = {executor.submit(process_link, link): link for link in links}
-        for future in as_completed(future_to_link):
+    seen = set()
+    stop_page = total_pages
+
+    with ThreadPoolExecutor(max_workers=page_workers) as page_executor, ThreadPoolExecutor(
+        max_workers=detail_workers
+    ) as detail_executor:
+        detail_futures = []
+
+        def dispatch(page, links):
+            nonlocal stop_page
+            for link in links:
+                numero_processo = numero_processo_from_link(link)
+                if numero_processo in known_processos:
+                    stop_page = min(stop_page, page)
+                    continue
+                if link not in seen:
+                    seen.add(link)
+                    detail_futures.append(detail_executor.submit(process_link, link, cache))
+
+        dispatch(0, page_links(first_page))
+
+        # Keep at most `page_workers` listing requests in flight so that an
+        # incremental run stops shortly after reaching known decisions
+        next_page = 1
+        pending = {}
+        while pending or (next_page < min(total_pages, stop_page)):
+            while len(pending) < page_workers and next_page < min(total_pages, stop_page):
+                pending[page_executor.submit(fetch_page, next_page)] = next_page
+                next_page += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dispatch(pending.pop(future), future.result())
+
+        for future in as_completed(detail_futures):
             result = future.result()
             if result:
                 data.append(result)
 
+    if incremental:
+        print(f"{len(data)} new decisions, stopped after page {min(stop_page, total_pages - 1)} of {total_pages}")
     return data
 
 
-def extract():
-    links = fetch_links()
-    processed_data = process_links_parallel(links)
+def extract(incremental=False):
+    """
+    Crawls the ementário and stages the decisions in S3. In incremental mode only
+    decisions not yet in the database are crawled. Returns the number of
+    decisions staged.
+    """
+    known_processos = loaded_processos() if incremental else None
+    cache = DecisionCache().load()
+    processed_data = crawl(known_processos, cache)
+    cache.save()
+    if not processed_data:
+        return 0
+
     df = pd.DataFrame(processed_data)
-    df["documento_interessado"] = df["interessados"].apply(
-        lambda x: [
-            clean_document(doc)
-            for doc in find_cpf_in_string(x) + find_cnpj_in_string(x)
-        ]
-    )
     df = df.explode("documento_interessado")
+    df["documento_interessado"] = only_digits(df["documento_interessado"])
     df['decisao'] = df['decisao'].str[:8000]
-    df["data_julgamento"] = (
-        df["data_julgamento"].str.split("/").str[2].str.zfill(4)
-        + "-"
-        + df["data_julgamento"].str.split("/").str[1].str.zfill(2)
-        + "-"
-        + df["data_julgamento"].str.split("/").str[0].str.zfill(2)
-    )
+    df["data_julgamento"] = parse_date(df["data_julgamento"], errors="coerce").dt.date
     df["data_observacao"] = datetime.date.today()
-    Loader().upload_file(df, "linker-etl", "processed/coaf/coaf.csv")
+    Loader().upload_file(df, "linker-etl", "processed/coaf/coaf.csv.zst")
+    return len(processed_data)
@@ -1,4 +1,3 @@
-import io
 import json
 import logging
 
@@ -7,31 +6,34 @@ import pandas as pd
 import psycopg2
 from botocore.exceptions import ClientError
 
+from key_index import KeyIndex, insert_new_rows, read_staged_keys
+from s3_staging import copy_format, write_staging
+
+KEY_COLS = ['numero_processo', 'documento_interessado']
+
 
 class Loader:
     '''
-    Loads csv file in s3
+    Stages dataframes in s3
     '''
 
     def __init__(self) -> None:
         pass
 
-    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None) -> None:
-        """Upload a dataframe as a csv to an S3 bucket
+    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None, schema=None) -> None:
+        """Upload a dataframe to an S3 bucket, as Parquet or CSV depending on the
+        extension of object_path (see s3_staging)
 
         :param df: Dataframe to upload
         :param bucket: Bucket to upload to
         :param object_path: S3 object path.
+        :param schema: Arrow schema of the target table, required for .parquet
         :return: True if file was uploaded, else False
         """
 
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-
         # Upload the file
-        s3_resource = boto3.resource('s3')
         try:
-            s3_resource.Object(bucket, object_path).put(Body=csv_buffer.getvalue())
+            write_staging(df, bucket, object_path, schema)
         except ClientError as e:
             logging.error(e)
             return False
@@ -64,7 +66,8 @@ class Loader:
 class S3_to_Redshift:
 
     def __init__(self) -> None:
-        pass
+        self.key_index_path = 'processed/coaf/key_index.npz'
+        self.s3_uri = 's3://linker-etl/processed/coaf/coaf.csv.zst'
 
     def get_credentials_aws(self):
         client = boto3.client('secretsmanager')
@@ -104,37 +107,42 @@ class S3_to_Redshift:
     def copy_s3_temp_table(self, cursor) -> None:
         credentials = self.get_credentials_aws()
 
-        COPY_QUERY = f"""COPY temp_coaf FROM 's3://linker-etl/processed/coaf/coaf.csv' CREDENTIALS 'aws_access_key_id={credentials['aws_access_key_id']};aws_secret_access_key={credentials['aws_secret_access_key']}' FORMAT AS CSV IGNOREHEADER 1;
+        COPY_QUERY = f"""COPY temp_coaf FROM '{self.s3_uri}' CREDENTIALS 'aws_access_key_id={credentials['aws_access_key_id']};aws_secret_access_key={credentials['aws_secret_access_key']}' {copy_format(self.s3_uri)};
         """
         cursor.execute(COPY_QUERY)
 
-    def insert_temp_table_data_to_main_table(self, cursor) -> None:
-        INSERT_QUERY = f"""
-        INSERT INTO sistema_financeiro.coaf_processo_administrativo_sancionador
-        (SELECT * FROM temp_coaf
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM sistema_financeiro.coaf_processo_administrativo_sancionador
-        WHERE temp_coaf.numero_processo = coaf.numero_processo
-        AND temp_coaf.numero_processo = coaf.documento_interessado
-        ));
-        """
-        cursor.execute(INSERT_QUERY)
+    def insert_temp_table_data_to_main_table(self, cursor, keys: pd.DataFrame) -> None:
+        index = KeyIndex.open('linker-etl', self.key_index_path, cursor, 'sistema_financeiro.coaf_processo_administrativo_sancionador', KEY_COLS)
+        insert_new_rows(cursor, 'temp_coaf', 'sistema_financeiro.coaf_processo_administrativo_sancionador', KEY_COLS, index, keys)
 
 
 def load():
     loader = S3_to_Redshift()
+    keys = read_staged_keys([loader.s3_uri], KEY_COLS)
+
     credentials = loader.get_credentials_redshift()
     conn, cursor = loader.connect_redshift(credentials)
 
     loader.create_temp_table(cursor)
     loader.copy_s3_temp_table(cursor)
 
-    loader.insert_temp_table_data_to_main_table(cursor)
+    loader.insert_temp_table_data_to_main_table(cursor, keys)
 
     cursor.execute("COMMIT")
     conn.close()
 
 
+def loaded_processos() -> set:
+    """
+    numero_processo of every decision already in the database
+    """
+    loader = S3_to_Redshift()
+    conn, cursor = loader.connect_redshift(loader.get_credentials_redshift())
+    cursor.execute("SELECT DISTINCT numero_processo FROM sistema_financeiro.coaf_processo_administrativo_sancionador;")
+    processos = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return processos
+
+
 if __name__ == '__main__':
     load()
@@ -1,11 +1,16 @@
 import pandas as pd
 from utils import *
 from extractor import extract
+import http_client
 from loader import load
 
 def lambda_handler(event=None, context=None):
-    extract()
-    load()
+    # {"incremental": true} only crawls decisions newer than the ones loaded
+    incremental = bool(event and event.get("incremental"))
+    staged = extract(incremental=incremental)
+    http_client.print_stats()
+    if staged:
+        load()
     
 
 if __name__ == "__main__":
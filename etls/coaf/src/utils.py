@@ -3,6 +3,8 @@ from lxml import etree
 import io
 import requests
 
+import http_client
+
 CPF_PATTERN = r"(?<![\.])\b[0-9]{3}\s*\.{0,1}\s*[0-9]{3}\s*\.{0,1}\s*[0-9]{3}\s*-{0,1}\s*[0-9]{2}\b"
 CNPJ_PATTERN = r"(?<![\.])\b[0-9]{2}\s*\.{0,1}\s*[0-9]{3}\s*\.{0,1}\s*[0-9]{3}\s*/{0,1}\s*[0-9]{4}\s*-{0,1}\s*[0-9]{2}\b"
 
@@ -16,15 +18,15 @@ def find_cpf_in_string(text):
 def find_cnpj_in_string(text):
     return find_in_string(CNPJ_PATTERN, text)
 
-def clean_document(document):
-    return document.replace(".", "").replace("-", "").replace("/", "").replace(" ", "")
+def parse_html(text):
+    parser = etree.HTMLParser()
+    return etree.parse(io.StringIO(text), parser)
 
 def get_html_tree(url):
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         response.raise_for_status()
-        parser = etree.HTMLParser()
-        return etree.parse(io.StringIO(response.text), parser)
+        return parse_html(response.text)
     except requests.RequestException as e:
         # Handle exceptions (like network errors)
         print(f"Error fetching URL {url}: {e}")
@@ -0,0 +1,161 @@
+"""
+Arrow-backed reader for the CSV files published by Portal da Transparência.
+
+The portal's files are ISO-8859-1, semicolon separated and read entirely as
+text. Arrow parses them with several threads, transcoding while it reads, and
+only converts the requested columns. Text columns come back as
+`string[pyarrow]` instead of Python objects, and columns with few distinct
+values (UF, município, órgão) can be dictionary encoded into categoricals.
+"""
+import csv as pycsv
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv
+
+ENCODING = "iso-8859-1"
+DELIMITER = ";"
+
+# Bytes handed to each parsing thread. Also the granularity of iter_csv.
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# Distinct values above which an automatically dictionary encoded column falls
+# back to plain strings
+AUTO_DICTIONARY_MAX_CARDINALITY = 1024
+
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+
+@contextmanager
+def _open(source, encoding: str, delimiter: str):
+    """
+    Opens `source` and reads its header line, leaving the file at the first row.
+    A path is opened here and closed on exit; a file object is left open for
+    its owner.
+    """
+    opened = isinstance(source, (str, bytes)) or hasattr(source, "__fspath__")
+    f = open(source, "rb") if opened else source
+    try:
+        line = f.readline().decode(encoding).rstrip("\r\n")
+        header = next(pycsv.reader([line], delimiter=delimiter), [])
+        yield f, header
+    finally:
+        if opened:
+            f.close()
+
+
+def _options(
+    header: List[str],
+    columns: Optional[Iterable[str]],
+    dictionary_columns: Iterable[str],
+    encoding: str,
+    delimiter: str,
+    block_size: int,
+):
+    read_options = csv.ReadOptions(encoding=encoding, block_size=block_size, column_names=header)
+    # Free-text fields may hold quoted line breaks, which can fall across blocks
+    parse_options = csv.ParseOptions(delimiter=delimiter, newlines_in_values=True)
+
+    # Every column is text, as with dtype=str, so type inference never strips the
+    # leading zeros of codes and documents. Empty fields are null, as in pandas.
+    column_types = {name: pa.string() for name in header}
+    column_types.update({name: pa.dictionary(pa.int32(), pa.string()) for name in dictionary_columns})
+    convert_options = csv.ConvertOptions(
+        include_columns=[name for name in columns if name in header] if columns is not None else None,
+        column_types=column_types,
+        strings_can_be_null=True,
+    )
+    return read_options, parse_options, convert_options
+
+
+def _dictionary_encode(table: pa.Table) -> pa.Table:
+    # Arrow's own auto_dict_encode only applies to inferred columns, and every
+    # column here has an explicit type
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if field.type == pa.string() and pc.count_distinct(column).as_py() <= AUTO_DICTIONARY_MAX_CARDINALITY:
+            table = table.set_column(i, field.name, column.dictionary_encode())
+    return table
+
+
+def _to_pandas(table: pa.Table, auto_dictionary: bool = False) -> pd.DataFrame:
+    if auto_dictionary:
+        table = _dictionary_encode(table)
+    return table.to_pandas(
+        types_mapper={pa.string(): STRING_DTYPE, pa.large_string(): STRING_DTYPE}.get,
+        split_blocks=True,
+        self_destruct=True,
+    )
+
+
+def read_csv(
+    source,
+    columns: Optional[Iterable[str]] = None,
+    dictionary_columns: Iterable[str] = (),
+    auto_dictionary: bool = False,
+    encoding: str = ENCODING,
+    delimiter: str = DELIMITER,
+    block_size: int = BLOCK_SIZE,
+) -> pd.DataFrame:
+    """
+    Reads a whole file into a DataFrame of `string[pyarrow]` columns.
+
+    :param source: Path or binary file object, e.g. a ZipFile member
+    :param columns: Columns to convert, all if None. Others are skipped while parsing
+    :param dictionary_columns: Columns returned as categoricals
+    :param auto_dictionary: Also return as categoricals any column with few distinct values
+    """
+    with _open(source, encoding, delimiter) as (stream, header):
+        read_options, parse_options, convert_options = _options(
+            header, columns, dictionary_columns, encoding, delimiter, block_size
+        )
+        table = csv.read_csv(
+            stream, read_options=read_options, parse_options=parse_options, convert_options=convert_options
+        )
+    return _to_pandas(table, auto_dictionary)
+
+
+def iter_csv(
+    source,
+    chunksize: int,
+    columns: Optional[Iterable[str]] = None,
+    dictionary_columns: Iterable[str] = (),
+    auto_dictionary: bool = False,
+    encoding: str = ENCODING,
+    delimiter: str = DELIMITER,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming version of read_csv, yielding frames of about `chunksize` rows
+    (whole parsed blocks, so a frame may hold up to one block more).
+    """
+    # A path stays open until the generator is exhausted or closed
+    with _open(source, encoding, delimiter) as (stream, header):
+        read_options, parse_options, convert_options = _options(
+            header, columns, dictionary_columns, encoding, delimiter, block_size
+        )
+        reader = csv.open_csv(
+            stream, read_options=read_options, parse_options=parse_options, convert_options=convert_options
+        )
+
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunksize:
+                yield _to_pandas(pa.Table.from_batches(batches), auto_dictionary)
+                batches, rows = [], 0
+        if batches:
+            yield _to_pandas(pa.Table.from_batches(batches), auto_dictionary)
+
+
+def to_object_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts text and categorical columns back to NumPy object arrays, for sinks
+    that only accept those (clickhouse-driver's use_numpy inserts replace nulls
+    with empty strings only in NumPy arrays).
+    """
+    return df.astype({column: object for column in df.select_dtypes(["string", "category"]).columns})
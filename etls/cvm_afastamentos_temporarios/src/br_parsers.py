@@ -0,0 +1,66 @@
+"""
+Parsers for the Brazilian formats of the source files: dd/mm/YYYY dates and
+1.234,56 decimals.
+
+Date columns repeat a few thousand distinct days over millions of rows, so a
+column is factorized and only its distinct values are parsed, with a fixed
+format. Decimals are rewritten to the dotted format with Arrow string kernels
+and converted with Arrow's cast, without going through Python floats.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+def parse_date(series: pd.Series, errors: str = "raise", date_format: str = DATE_FORMAT) -> pd.Series:
+    """
+    Parses a column of dd/mm/YYYY dates into datetime64. Nulls become NaT, and
+    so do invalid dates with errors="coerce", as with pd.to_datetime.
+    """
+    codes, uniques = pd.factorize(series)
+    dates = pd.DatetimeIndex(pd.to_datetime(uniques, format=date_format, errors=errors))
+    # code -1 (null) takes NaT
+    parsed = dates.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(parsed, index=series.index, name=series.name)
+
+
+def _yyyymmdd(value: str) -> int:
+    day, month, year = value.split("/")
+    return int(year + month + day)
+
+
+def date_to_int(series: pd.Series) -> pd.Series:
+    """
+    Converts a column of dd/mm/YYYY dates into YYYYMMDD integers, keeping nulls
+    as <NA>.
+    """
+    codes, uniques = pd.factorize(series)
+    converted = pd.array([_yyyymmdd(value) for value in uniques] + [None], dtype="Int64")
+    # code -1 (null) takes the trailing <NA>
+    return pd.Series(converted.take(codes), index=series.index, name=series.name)
+
+
+def _dotted(series: pd.Series) -> pa.Array:
+    text = pa.array(series, type=pa.string(), from_pandas=True)
+    brazilian = pc.match_substring(text, ",")
+    dotted = pc.replace_substring(pc.replace_substring(text, ".", ""), ",", ".")
+    return pc.if_else(brazilian, dotted, text)
+
+
+def decimal_text(series: pd.Series) -> pd.Series:
+    """
+    Rewrites 1.234,56 decimals as 1234.56. Values without a decimal comma are
+    kept as they are, so already dotted values pass through unchanged.
+    """
+    return pd.Series(pd.arrays.ArrowStringArray(_dotted(series)), index=series.index, name=series.name)
+
+
+def parse_decimal(series: pd.Series) -> pd.Series:
+    """
+    Parses a column of 1.234,56 decimals into float64, with nulls as NaN.
+    Unlike replacing the comma alone, thousands separators are handled.
+    """
+    values = pc.cast(_dotted(series), pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.Series(values, index=series.index, name=series.name)
@@ -1,5 +1,5 @@
 import datetime
-import requests
+import http_client
 from io import StringIO
 
 import pandas as pd
@@ -11,7 +11,7 @@ from loader import Loader
 def extract():
     url = "https://www.gov.br/cvm/pt-br/assuntos/protecao/afastamentos-impedimentos-temporarios/afastamentos-penalidades-temporarias"
 
-    r = requests.get(url)
+    r = http_client.get(url)
     df = pd.read_html(StringIO(r.text))[0]
     new_header = df.iloc[0]
     df = df[1:]
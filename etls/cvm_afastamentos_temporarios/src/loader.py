@@ -1,4 +1,3 @@
-import io
 import json
 from datetime import datetime
 import logging
@@ -8,31 +7,34 @@ import pandas as pd
 import psycopg2
 from botocore.exceptions import ClientError
 
+from key_index import KeyIndex, insert_new_rows, read_staged_keys
+from s3_staging import copy_format, write_staging
+
+KEY_COLS = ['numero_processo', 'nome']
+
 
 class Loader:
     '''
-    Loads csv file in s3
+    Stages dataframes in s3
     '''
 
     def __init__(self) -> None:
         pass
 
-    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None) -> None:
-        """Upload a dataframe as a csv to an S3 bucket
+    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None, schema=None) -> None:
+        """Upload a dataframe to an S3 bucket, as Parquet or CSV depending on the
+        extension of object_path (see s3_staging)
 
         :param df: Dataframe to upload
         :param bucket: Bucket to upload to
         :param object_path: S3 object path.
+        :param schema: Arrow schema of the target table, required for .parquet
         :return: True if file was uploaded, else False
         """
 
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-
         # Upload the file
-        s3_resource = boto3.resource('s3')
         try:
-            s3_resource.Object(bucket, object_path).put(Body=csv_buffer.getvalue())
+            write_staging(df, bucket, object_path, schema)
         except ClientError as e:
             logging.error(e)
             return False
@@ -65,7 +67,8 @@ class Loader:
 class S3_to_Redshift:
 
     def __init__(self) -> None:
-        pass
+        self.key_index_path = 'processed/cvm/afastamentos-temporarios/key_index.npz'
+        self.s3_uri = f"s3://linker-etl/processed/cvm/afastamentos-temporarios/{datetime.today().strftime('%Y-%m-%d')}.csv.zst"
 
     def get_credentials_aws(self):
         client = boto3.client('secretsmanager')
@@ -105,33 +108,26 @@ class S3_to_Redshift:
     def copy_s3_temp_table(self, cursor) -> None:
         credentials = self.get_credentials_aws()
 
-        COPY_QUERY = f"""COPY temp_cvm_afastamentos FROM 's3://linker-etl/processed/cvm/afastamentos-temporarios/{datetime.today().strftime('%Y-%m-%d')}.csv' CREDENTIALS 'aws_access_key_id={credentials['aws_access_key_id']};aws_secret_access_key={credentials['aws_secret_access_key']}' FORMAT AS CSV IGNOREHEADER 1;
+        COPY_QUERY = f"""COPY temp_cvm_afastamentos FROM '{self.s3_uri}' CREDENTIALS 'aws_access_key_id={credentials['aws_access_key_id']};aws_secret_access_key={credentials['aws_secret_access_key']}' {copy_format(self.s3_uri)};
         """
         cursor.execute(COPY_QUERY)
 
-    def insert_temp_table_data_to_main_table(self, cursor) -> None:
-        INSERT_QUERY = f"""
-        INSERT INTO sistema_financeiro.cvm_afastamento_temporario
-        (SELECT * FROM temp_cvm_afastamentos
-        WHERE NOT EXISTS (
-            SELECT 1
-            FROM sistema_financeiro.cvm_afastamento_temporario 
-        WHERE temp_cvm_afastamentos.numero_processo = cvm_afastamento_temporario.numero_processo
-        AND temp_cvm_afastamentos.nome = cvm_afastamento_temporario.nome
-        ));
-        """
-        cursor.execute(INSERT_QUERY)
+    def insert_temp_table_data_to_main_table(self, cursor, keys: pd.DataFrame) -> None:
+        index = KeyIndex.open('linker-etl', self.key_index_path, cursor, 'sistema_financeiro.cvm_afastamento_temporario', KEY_COLS)
+        insert_new_rows(cursor, 'temp_cvm_afastamentos', 'sistema_financeiro.cvm_afastamento_temporario', KEY_COLS, index, keys)
 
 
 def load():
     loader = S3_to_Redshift()
+    keys = read_staged_keys([loader.s3_uri], KEY_COLS)
+
     credentials = loader.get_credentials_redshift()
     conn, cursor = loader.connect_redshift(credentials)
 
     loader.create_temp_table(cursor)
     loader.copy_s3_temp_table(cursor)
 
-    loader.insert_temp_table_data_to_main_table(cursor)
+    loader.insert_temp_table_data_to_main_table(cursor, keys)
 
     cursor.execute("COMMIT")
     conn.close()
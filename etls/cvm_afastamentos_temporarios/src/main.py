@@ -1,9 +1,11 @@
 from extractor import extract
+import http_client
 from transformer import transform
 from loader import load
 
 def lambda_handler(event=None, context=None):
     extract()
+    http_client.print_stats()
     transform()
     load()
     
@@ -0,0 +1,59 @@
+"""
+Normalization of names and descriptions before they are loaded: surrounding
+whitespace stripped, upper case and accents removed ("São Paulo " -> "SAO PAULO").
+
+Columns such as município, órgão or segmento repeat a few thousand distinct
+values over millions of rows, so a column is factorized first and only its
+distinct values are normalized. For low-cardinality columns the normalized
+values are also kept in a process-wide LRU cache, shared by every column and
+chunk normalized in the process.
+"""
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Distinct values remembered across calls
+CACHE_SIZE = 1 << 18
+
+# Columns with more distinct values than this (names, mostly) bypass the cache:
+# they would only evict the repeated values and pay for the lookups
+MAX_CACHED_UNIQUES = 1 << 16
+
+
+def _normalize_str(value: str, remove: str = "", collapse_whitespace: bool = False) -> str:
+    # split/join also strips, and ASCII text has no accents to decompose
+    value = " ".join(value.split()) if collapse_whitespace else value.strip()
+    value = value.upper()
+    if not value.isascii():
+        value = unicodedata.normalize("NFKD", value)
+        value = value.encode("ascii", errors="ignore").decode("utf-8")
+    if remove:
+        value = value.translate(str.maketrans("", "", remove))
+    return value
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_str(value: str, remove: str = "", collapse_whitespace: bool = False) -> str:
+    """
+    Normalizes a single value, also deleting every character in `remove` and,
+    with `collapse_whitespace`, turning inner runs of whitespace into one space.
+    """
+    return _normalize_str(value, remove, collapse_whitespace)
+
+
+def normalize_str_series(series: pd.Series, remove: str = "", collapse_whitespace: bool = False) -> pd.Series:
+    """
+    Normalizes every value of a text column in a single pass over its distinct
+    values. Nulls and non-text values become NaN, as with the equivalent chain of
+    `.str` methods.
+    """
+    codes, uniques = pd.factorize(series)
+    normalize = normalize_str if len(uniques) <= MAX_CACHED_UNIQUES else _normalize_str
+    # code -1 (null) takes the trailing NaN
+    normalized = np.array(
+        [normalize(value, remove, collapse_whitespace) if isinstance(value, str) else np.nan for value in uniques] + [np.nan],
+        dtype=object,
+    )
+    return pd.Series(normalized[codes], index=series.index, name=series.name)
@@ -2,14 +2,16 @@ from datetime import datetime
 
 import pandas as pd
 
+from br_parsers import parse_date
 from loader import Loader
+from text_normalization import normalize_str_series
 
 
 class Transformer(Loader):
     def __init__(self):
         self.bucket = "linker-etl"
         self.download_path = f"raw/cvm/afastamentos-temporarios/{datetime.today().strftime('%Y-%m-%d')}.csv"
-        self.upload_path = f'processed/cvm/afastamentos-temporarios/{datetime.today().strftime("%Y-%m-%d")}.csv'
+        self.upload_path = f'processed/cvm/afastamentos-temporarios/{datetime.today().strftime("%Y-%m-%d")}.csv.zst'
         self.column_order = [
             "numero_processo",
             "nome",
@@ -20,16 +22,6 @@ class Transformer(Loader):
             "link",
         ]
 
-    @staticmethod
-    def normalize_str_series(series: pd.Series) -> pd.Series:
-        return (
-            series.str.strip()
-            .str.upper()
-            .str.normalize("NFKD")
-            .str.encode("ascii", errors="ignore")
-            .str.decode("utf-8")
-        )
-
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         df = df.rename(
             columns={
@@ -43,13 +35,9 @@ class Transformer(Loader):
             }
         )
 
-        df["nome"] = self.normalize_str_series(df["nome"])
-        df["data_julgamento"] = pd.to_datetime(
-            df["data_julgamento"], format="%d/%m/%Y", errors="coerce"
-        )
-        df["data_vigencia"] = pd.to_datetime(
-            df["data_vigencia"], format="%d/%m/%Y", errors="coerce"
-        )
+        df["nome"] = normalize_str_series(df["nome"])
+        df["data_julgamento"] = parse_date(df["data_julgamento"], errors="coerce")
+        df["data_vigencia"] = parse_date(df["data_vigencia"], errors="coerce")
 
         return df
 
@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import boto3
+
+from connector import Connector
+from extractor import Extractor
+from loader import load_batch
+from transformer import TRANSFORMERS
+
+SPECIFIC_SETS = ["empenho", "liquidacao", "pagamento"]
+
+# Days extracted and transformed at the same time. Threads rather than processes:
+# the work is mostly S3/portal I/O and Lambda has no /dev/shm for multiprocessing.
+MAX_WORKERS = 4
+
+# Days staged before a consolidated Redshift load
+BATCH_DAYS = 30
+
+
+class BackfillState:
+    """
+    Per-day completion of a backfill, kept in Redshift so an interrupted run
+    (e.g. a Lambda timeout) resumes where it stopped.
+    """
+
+    table = "transparencia.despesas_backfill_estado"
+
+    def __init__(self, cursor) -> None:
+        self.cursor = cursor
+        self.cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                specific_set VARCHAR(16),
+                dia DATE,
+                status VARCHAR(16),
+                atualizado_em TIMESTAMP
+            );
+            """
+        )
+
+    def loaded_days(self, specific_set: str, start: date, end: date) -> set:
+        self.cursor.execute(
+            f"SELECT dia FROM {self.table} WHERE specific_set = %s AND status = 'loaded' AND dia BETWEEN %s AND %s",
+            (specific_set, start, end),
+        )
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def mark(self, specific_set: str, days: List[date], status: str) -> None:
+        if not days:
+            return
+        self.cursor.execute(
+            f"DELETE FROM {self.table} WHERE specific_set = %s AND dia IN %s",
+            (specific_set, tuple(days)),
+        )
+        now = datetime.now()
+        self.cursor.executemany(
+            f"INSERT INTO {self.table} (specific_set, dia, status, atualizado_em) VALUES (%s, %s, %s, %s)",
+            [(specific_set, day, status, now) for day in days],
+        )
+
+
+def split_day(day: date):
+    return day.strftime("%Y"), day.strftime("%m"), day.strftime("%d")
+
+
+def stage_day(day: date, specific_sets: List[str]) -> Dict[str, bool]:
+    """
+    Extracts one day's zip and stages the processed file of each set in S3.
+    Returns, per set, whether the day was staged (False if not published).
+    """
+    year, month, dd = split_day(day)
+    if not Extractor(year, month, dd).run():
+        return {specific_set: False for specific_set in specific_sets}
+
+    for specific_set in specific_sets:
+        TRANSFORMERS[specific_set](year, month, dd).run()
+    return {specific_set: True for specific_set in specific_sets}
+
+
+def backfill(
+    start: str,
+    end: str,
+    specific_sets: List[str] = SPECIFIC_SETS,
+    max_workers: int = MAX_WORKERS,
+    batch_days: int = BATCH_DAYS,
+) -> None:
+    """
+    Loads every day between start and end (inclusive, YYYY-MM-DD) not yet
+    recorded as loaded. Days are extracted and transformed in a bounded worker
+    pool and each batch of days is loaded into Redshift with a single COPY.
+    """
+    start_day = datetime.strptime(start, "%Y-%m-%d").date()
+    end_day = datetime.strptime(end, "%Y-%m-%d").date()
+
+    connector = Connector()
+    conn, cursor = connector.connect_redshift(connector.get_credentials_redshift())
+    state = BackfillState(cursor)
+
+    loaded = {
+        specific_set: state.loaded_days(specific_set, start_day, end_day)
+        for specific_set in specific_sets
+    }
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    pending = [day for day in days if any(day not in loaded[s] for s in specific_sets)]
+    print(f"{len(pending)} of {len(days)} days to backfill")
+
+    # Creating the default session's clients from several threads at once is not
+    # thread safe, so the first one is created here
+    boto3.client("s3")
+
+    for i in range(0, len(pending), batch_days):
+        batch = pending[i : i + batch_days]
+        staged = {specific_set: [] for specific_set in specific_sets}
+        missing = {specific_set: [] for specific_set in specific_sets}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(stage_day, day, [s for s in specific_sets if day not in loaded[s]]): day
+                for day in batch
+            }
+            for future in as_completed(futures):
+                day = futures[future]
+                for specific_set, ok in future.result().items():
+                    (staged if ok else missing)[specific_set].append(day)
+
+        for specific_set in specific_sets:
+            days_staged = sorted(staged[specific_set])
+            state.mark(specific_set, missing[specific_set], "missing")
+            state.mark(specific_set, days_staged, "staged")
+            if days_staged:
+                load_batch(specific_set, [split_day(day) for day in days_staged])
+                state.mark(specific_set, days_staged, "loaded")
+            print(specific_set, f"{batch[0]} - {batch[-1]}:", len(days_staged), "days loaded")
+
+    conn.close()
@@ -1,10 +1,34 @@
 import json
-from io import BytesIO
+import re
+from typing import Optional
 
 import boto3
 import requests
 
+import http_client
 from loader import Loader
+from s3_staging import MultipartUpload
+
+# Bytes requested from the portal per network read
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+# Range requests attempted after a dropped connection before giving up
+MAX_RESUMES = 5
+
+
+def resume_validator(response: requests.Response) -> Optional[str]:
+    """
+    If-Range value that identifies the file being downloaded, or None when the
+    portal sent neither an ETag nor a Last-Modified date.
+    """
+    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+
+def content_range_start(response: requests.Response) -> Optional[int]:
+    """
+    First byte of a 206 response, from its "Content-Range: bytes 40-99/100" header.
+    """
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
 
 
 class Extractor(Loader):
@@ -26,34 +50,83 @@ class Extractor(Loader):
 
         return credentials
 
+    def stream_to_s3(self, response: requests.Response, object_path: str, headers: dict) -> None:
+        """
+        Streams the download into an S3 multipart upload. If the connection drops,
+        the download resumes from the last received byte with an HTTP Range request,
+        conditioned with If-Range on the file's ETag or Last-Modified. When the
+        portal sent neither, a range could come from a newer file, so the download
+        starts over instead.
+        """
+        downloaded = 0
+        validator = resume_validator(response)
+
+        upload = MultipartUpload(self.bucket, object_path)
+        try:
+            for attempt in range(MAX_RESUMES + 1):
+                if attempt > 0:
+                    print(f"Connection dropped after {downloaded} bytes, resuming")
+                    if validator is None:
+                        print("No ETag or Last-Modified to resume from, downloading the whole file again")
+                        response = http_client.get(self.download_URL, headers=headers, stream=True)
+                    else:
+                        response = http_client.get(
+                            self.download_URL,
+                            headers={**headers, "If-Range": validator, "Range": f"bytes={downloaded}-"},
+                            stream=True,
+                        )
+
+                    if response.status_code == 200:
+                        # If-Range failed (the file changed), the range was ignored or
+                        # not requested: the whole file is sent again, possibly a new
+                        # one, so the parts already uploaded are dropped
+                        print("Portal sent the whole file, restarting the upload")
+                        upload.abort()
+                        upload = MultipartUpload(self.bucket, object_path)
+                        downloaded = 0
+                        validator = resume_validator(response)
+                    elif response.status_code == 206:
+                        start = content_range_start(response)
+                        if start != downloaded:
+                            raise ValueError(f"Resumed download starts at byte {start}, expected {downloaded}")
+                    else:
+                        response.raise_for_status()
+                        raise ValueError(f"Unexpected status {response.status_code} resuming download")
+
+                try:
+                    for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                        upload.write(block)
+                        downloaded += len(block)
+                except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                    if attempt == MAX_RESUMES:
+                        raise
+                    continue
+                upload.close()
+                return
+        except BaseException:
+            if not upload.closed:
+                upload.abort()
+            raise
+
     def run(self) -> bool:
         """
-        Downloads zip from URL, renames it to format "YYYYMM" and saves it in specific folder, defined in class atribute "extracted_file_directory'
+        Streams the day's zip from the portal into S3 as "raw/despesas_governo_federal/YYYYMMDD.zip", unless it is already there
         """
 
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
 
-        s3 = boto3.client("s3")
+        object_path = f"raw/despesas_governo_federal/{self.year}{self.month}{self.day}.zip"
 
-        try:
-            s3.head_object(
-                Bucket="linker-etl",
-                Key=f"raw/despesas_governo_federal/{self.year}{self.month}{self.day}.zip",
-            )
-            return True
-        except Exception:
-            r = requests.get(self.download_URL, headers=headers)
-            if r.status_code != 200:
-                print(r.text)
-                print("File doesn't exist yet on Portal da Transparencia")
-                return False
-
-
-            s3.upload_fileobj(
-                BytesIO(r.content),
-                "linker-etl",
-                f"raw/despesas_governo_federal/{self.year}{self.month}{self.day}.zip",
-            )
+        if self.check_if_file_exists(self.bucket, object_path):
             return True
+
+        r = http_client.get(self.download_URL, headers=headers, stream=True)
+        if r.status_code != 200:
+            print(r.text)
+            print("File doesn't exist yet on Portal da Transparencia")
+            return False
+
+        self.stream_to_s3(r, object_path, headers)
+        return True
@@ -0,0 +1,224 @@
+"""
+Incremental inserts into Redshift tables without a full anti-join.
+
+The loaders used to insert a staged batch with INSERT ... WHERE NOT EXISTS
+against the whole target table. That query costs more as the table grows,
+even though almost every staged row is new. A KeyIndex keeps the 64-bit
+hashes of every primary key already loaded, as a sorted array stored in
+S3 together with the row count of the table when it was saved. It is built
+from the table on the first run.
+
+The key columns of the staged files are read from S3 and hashed in
+Python before the COPY (`read_staged_keys`), so the batch is never read
+back from Redshift. `insert_new_rows` checks their hashes against the
+index:
+
+- a key missing from the index was never loaded, so its row is inserted
+  directly.
+- a key found in the index is probably loaded already, or its hash
+  collides. Only these rows go through the NOT EXISTS merge, restricted
+  to their keys, which are the only ones sent to the server.
+
+A key missing from the index must really be missing from the table, or
+its row is inserted twice. So the table is locked for the rest of the
+transaction before the index is used, which makes concurrent loads of the
+table (the daily run and a backfill) wait for each other. Then its row
+count is compared with the one saved with the index. A different count
+means rows were written by something else: another load that saved its
+index in between, a failed commit, or a manual insert. The drift is logged
+and the index is rebuilt from the table before it is used. The count only
+misses writes that delete as many rows as they add, and nothing deletes
+from the tables loaded this way.
+
+The rebuild reads the key columns of the whole table, the cost that grows
+with the table and that the index otherwise avoids. It is paid once, by
+the next load, after every write made outside insert_new_rows: run manual
+backfills and fixes through a loader (or rebuild the index right after
+them) rather than with ad hoc INSERTs and DELETEs.
+
+Keys are hashed as text: the staged text columns as written in the file,
+which COPY loads unchanged, and the table keys as read back from Redshift.
+The key columns of these tables are all text, so both hash alike.
+"""
+import io
+from typing import List
+
+import boto3
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+from psycopg2.extras import execute_values
+from pyarrow import csv
+
+# Rows fetched per round trip when reading keys from Redshift
+FETCH_ROWS = 100_000
+# Above this many probable duplicates (e.g. a day loaded again), a single
+# NOT EXISTS over the whole batch is cheaper than sending their keys over
+MAX_MERGE_KEYS = 50_000
+
+
+def hash_keys(keys: pd.DataFrame) -> np.ndarray:
+    """uint64 hash of each row of key values"""
+    return pd.util.hash_pandas_object(keys.astype(str), index=False).to_numpy()
+
+
+def count_rows(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM {table};")
+    return cursor.fetchone()[0]
+
+
+class KeyIndex:
+    def __init__(self, bucket: str, object_path: str, hashes: np.ndarray = None, rows: int = None) -> None:
+        self.bucket = bucket
+        self.object_path = object_path
+        self.hashes = np.unique(hashes) if hashes is not None else np.empty(0, dtype=np.uint64)
+        # Row count of the table the hashes were taken from, None if unknown
+        self.rows = rows
+
+    @classmethod
+    def load(cls, bucket: str, object_path: str):
+        """Index stored in S3, or None if there is none yet"""
+        try:
+            response = boto3.client("s3").get_object(Bucket=bucket, Key=object_path)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+        stored = np.load(io.BytesIO(response["Body"].read()))
+        return cls(bucket, object_path, stored["hashes"], int(stored["rows"]))
+
+    @classmethod
+    def from_table(cls, bucket: str, object_path: str, cursor, table: str, key_cols: List[str]):
+        """Builds the index from the keys already in a Redshift table"""
+        rows = count_rows(cursor, table)
+        hashes = [hash_keys(keys) for keys in fetch_keys(cursor, table, key_cols)]
+        index = cls(bucket, object_path, np.concatenate(hashes) if hashes else None, rows)
+        print(f"Built key index of {table} with {len(index.hashes)} keys")
+        return index
+
+    @classmethod
+    def open(cls, bucket: str, object_path: str, cursor, table: str, key_cols: List[str]):
+        index = cls.load(bucket, object_path)
+        if index is None:
+            index = cls.from_table(bucket, object_path, cursor, table, key_cols)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.hashes, hashes)
+        found = np.zeros(len(hashes), dtype=bool)
+        inside = positions < len(self.hashes)
+        found[inside] = self.hashes[positions[inside]] == hashes[inside]
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        self.hashes = np.union1d(self.hashes, hashes)
+
+    def save(self) -> None:
+        buffer = io.BytesIO()
+        np.savez(buffer, hashes=self.hashes, rows=self.rows)
+        boto3.client("s3").put_object(Bucket=self.bucket, Key=self.object_path, Body=buffer.getvalue())
+
+
+def fetch_keys(cursor, table: str, key_cols: List[str]):
+    """Yields the key columns of a table in frames of FETCH_ROWS rows"""
+    # A named cursor is read on the server side, a batch at a time
+    with cursor.connection.cursor(name="key_index_fetch") as server_cursor:
+        server_cursor.execute(f"SELECT {', '.join(key_cols)} FROM {table}")
+        while True:
+            rows = server_cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=key_cols)
+
+
+def read_staged_keys(s3_uris: List[str], key_cols: List[str]) -> pd.DataFrame:
+    """
+    Key columns of the files staged by s3_staging.write_staging, read from S3
+    without going through Redshift. Only the key columns are parsed.
+    """
+    s3 = boto3.client("s3")
+    frames = []
+    for s3_uri in s3_uris:
+        bucket, key = s3_uri[len("s3://"):].split("/", 1)
+        # Staged files are compressed, so the download is kept whole in memory
+        body = pa.BufferReader(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+        if key.endswith(".parquet"):
+            table = pq.read_table(body, columns=key_cols)
+        else:
+            stream = pa.CompressedInputStream(body, "zstd") if key.endswith(".zst") else body
+            table = csv.read_csv(
+                stream,
+                convert_options=csv.ConvertOptions(
+                    include_columns=key_cols, column_types={col: pa.string() for col in key_cols}
+                ),
+            )
+        frames.append(table.to_pandas())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=key_cols)
+
+
+def insert_new_rows(
+    cursor, temp_table: str, table: str, key_cols: List[str], index: KeyIndex, keys: pd.DataFrame
+) -> KeyIndex:
+    """
+    Inserts the rows of temp_table whose keys are not in table yet, the same
+    rows as the former INSERT ... WHERE NOT EXISTS, and adds their keys to the
+    index. `keys` are the key columns of the staged rows, from read_staged_keys.
+    The caller commits, which releases the lock on table. Returns the index,
+    rebuilt if it was out of date.
+    """
+    # Hashed before taking the lock, which other loads of the table wait on
+    hashes = hash_keys(keys)
+
+    # Held until commit: another load of the table waits here, and then sees
+    # the rows of this one in the count below
+    cursor.execute(f"LOCK {table};")
+    rows = count_rows(cursor, table)
+    if index.rows != rows:
+        drift = rows - index.rows if index.rows is not None else rows
+        print(
+            f"Key index of {table} is out of sync: saved at {index.rows} rows, the table has {rows} "
+            f"({drift:+d}), written outside insert_new_rows. Rebuilding it with a full scan of the keys"
+        )
+        index = KeyIndex.from_table(index.bucket, index.object_path, cursor, table, key_cols)
+
+    probable = keys[index.contains(hashes)].drop_duplicates()
+
+    matches = " AND ".join(f"t.{col} = {temp_table}.{col}" for col in key_cols)
+    not_loaded = f"NOT EXISTS (SELECT 1 FROM {table} t WHERE {matches})"
+    if probable.empty:
+        cursor.execute(f"INSERT INTO {table} (SELECT * FROM {temp_table});")
+    elif len(probable) > MAX_MERGE_KEYS:
+        cursor.execute(f"INSERT INTO {table} (SELECT * FROM {temp_table} WHERE {not_loaded});")
+    else:
+        # The probable duplicates go to a table of their own, to split the batch in two
+        cursor.execute(f"CREATE TEMPORARY TABLE {temp_table}_keys AS SELECT {', '.join(key_cols)} FROM {temp_table} LIMIT 0;")
+        execute_values(
+            cursor,
+            f"INSERT INTO {temp_table}_keys ({', '.join(key_cols)}) VALUES %s",
+            list(probable.itertuples(index=False, name=None)),
+        )
+        joined = " AND ".join(f"k.{col} = {temp_table}.{col}" for col in key_cols)
+        cursor.execute(f"""
+        INSERT INTO {table} (
+            SELECT {temp_table}.* FROM {temp_table} LEFT JOIN {temp_table}_keys k ON {joined}
+            WHERE k.{key_cols[0]} IS NULL
+        );
+        INSERT INTO {table} (
+            SELECT {temp_table}.* FROM {temp_table} JOIN {temp_table}_keys k ON {joined}
+            WHERE {not_loaded}
+        );
+        """)
+        cursor.execute(f"DROP TABLE {temp_table}_keys;")
+
+    index.add(hashes)
+    index.rows = count_rows(cursor, table)
+    # Saved before the commit: if the commit fails, the row count no longer
+    # matches and the next load rebuilds the index
+    index.save()
+    print(f"{table}: {len(keys)} staged rows, {len(probable)} keys merged against the table, index of {len(index)} keys")
+    return index
@@ -1,4 +1,3 @@
-import io
 import json
 import logging
 
@@ -7,31 +6,32 @@ import pandas as pd
 import psycopg2
 from botocore.exceptions import ClientError
 
+from key_index import KeyIndex, insert_new_rows, read_staged_keys
+from s3_staging import copy_format, write_staging
+
 
 class Loader:
     """
-    Loads csv file in s3
+    Stages dataframes in s3
     """
 
     def __init__(self) -> None:
         pass
 
-    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None) -> None:
-        """Upload a dataframe as a csv to an S3 bucket
+    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None, schema=None) -> None:
+        """Upload a dataframe to an S3 bucket, as Parquet or CSV depending on the
+        extension of object_path (see s3_staging)
 
         :param df: Dataframe to upload
         :param bucket: Bucket to upload to
         :param object_path: S3 object path.
+        :param schema: Arrow schema of the target table, required for .parquet
         :return: True if file was uploaded, else False
         """
 
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-
         # Upload the file
-        s3_resource = boto3.resource("s3")
         try:
-            s3_resource.Object(bucket, object_path).put(Body=csv_buffer.getvalue())
+            write_staging(df, bucket, object_path, schema)
         except ClientError as e:
             logging.error(e)
             return False
@@ -56,13 +56,20 @@ class Loader:
         return True
 
 
-
 class S3_to_Redshift:
     specific_set = ""
     primary_key = ""
     redshift_full_table_name = ""
+    # when True, s3_uri points to a manifest listing several staged files
+    manifest = False
+
     def __init__(self, year: str, month: str, day: str) -> None:
-        self.s3_uri = f"s3://linker-etl/processed/despesas_governo_federal/{self.specific_set}/{year}{month}{day}.csv"
+        self.s3_uri = f"s3://linker-etl/processed/despesas_governo_federal/{self.specific_set}/{year}{month}{day}.csv.zst"
+        # staged files behind s3_uri, whose keys are read before the COPY
+        self.staged_uris = [self.s3_uri]
+        # kept apart from s3_uri, which load_batch points at a manifest
+        self.copy_format = copy_format(self.s3_uri)
+        self.key_index_path = f"processed/despesas_governo_federal/{self.specific_set}/key_index.npz"
 
     def get_credentials_redshift(self):
         client = boto3.client("secretsmanager")
@@ -96,24 +103,25 @@ class S3_to_Redshift:
         COPY_QUERY = f"""COPY temp
                          FROM '{self.s3_uri}'
                          WITH IAM_ROLE 'arn:aws:iam::345917470638:role/redshiftRole'
-                         FORMAT AS CSV IGNOREHEADER 1;
+                         {"MANIFEST" if self.manifest else ""}
+                         {self.copy_format};
         """
         cursor.execute(COPY_QUERY)
 
-    def insert_temp_table_data_to_main_table(self, cursor) -> None:
-        INSERT_QUERY = f"""
-        INSERT INTO {self.redshift_full_table_name} ( SELECT * FROM temp WHERE NOT EXISTS (SELECT * FROM {self.redshift_full_table_name} t WHERE temp.{self.primary_key} = t.{self.primary_key}));
-        """
-        cursor.execute(INSERT_QUERY)
+    def insert_temp_table_data_to_main_table(self, cursor, keys: pd.DataFrame) -> None:
+        index = KeyIndex.open("linker-etl", self.key_index_path, cursor, self.redshift_full_table_name, [self.primary_key])
+        insert_new_rows(cursor, "temp", self.redshift_full_table_name, [self.primary_key], index, keys)
 
     def run(self):
+        keys = read_staged_keys(self.staged_uris, [self.primary_key])
+
         credentials = self.get_credentials_redshift()
         conn, cursor = self.connect_redshift(credentials)
 
         self.create_temp_table(cursor)
         self.copy_s3_temp_table(cursor)
 
-        self.insert_temp_table_data_to_main_table(cursor)
+        self.insert_temp_table_data_to_main_table(cursor, keys)
 
         cursor.execute("COMMIT")
         conn.close()
@@ -133,6 +141,12 @@ class PagamentoLoader(S3_to_Redshift):
     primary_key = "codigo_pagamento"
     redshift_full_table_name = "transparencia.pagamento"
 
+LOADERS = {
+    "empenho": EmpenhoLoader,
+    "liquidacao": LiquidacaoLoader,
+    "pagamento": PagamentoLoader,
+}
+
 
 def load(specific_set: str, year: str, month: str, day: str):
     if specific_set == "empenho":
@@ -144,5 +158,36 @@ def load(specific_set: str, year: str, month: str, day: str):
     else:
         raise ValueError("specific_set must be one of: empenho, liquidacao, pagamento")
 
+
+def load_batch(specific_set: str, days: list):
+    """Loads the staged files of several days with a single COPY
+
+    :param specific_set: One of empenho, liquidacao, pagamento
+    :param days: List of (year, month, day) string tuples already staged in S3
+    """
+    if specific_set not in LOADERS:
+        raise ValueError("specific_set must be one of: empenho, liquidacao, pagamento")
+
+    loaders = [LOADERS[specific_set](year, month, day) for year, month, day in days]
+    first, last = "".join(days[0]), "".join(days[-1])
+    manifest_path = f"processed/despesas_governo_federal/{specific_set}/manifests/{first}_{last}.manifest"
+
+    s3_client = boto3.client("s3")
+    entries = []
+    for loader in loaders:
+        key = loader.s3_uri.replace("s3://linker-etl/", "", 1)
+        # Redshift requires the size of every columnar file listed in a manifest
+        size = s3_client.head_object(Bucket="linker-etl", Key=key)["ContentLength"]
+        entries.append({"url": loader.s3_uri, "mandatory": True, "meta": {"content_length": size}})
+    manifest = {"entries": entries}
+    s3_client.put_object(Bucket="linker-etl", Key=manifest_path, Body=json.dumps(manifest))
+
+    loader = loaders[0]
+    loader.s3_uri = f"s3://linker-etl/{manifest_path}"
+    loader.staged_uris = [day_loader.s3_uri for day_loader in loaders]
+    loader.manifest = True
+    loader.run()
+
+
 if __name__ == "__main__":
     load()
@@ -1,3 +1,4 @@
+from backfill import backfill
 from connector import Connector
 from extractor import Extractor
 from loader import load
@@ -6,6 +7,11 @@ from datetime import datetime
 
 
 def lambda_handler(event=None, context=None):
+    # {"backfill": {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD", "max_workers": 4}}
+    if event and "backfill" in event:
+        backfill(**event["backfill"])
+        return
+
     connector = Connector()
     conn, cursor = connector.connect_redshift(connector.get_credentials_redshift())
     exists = True
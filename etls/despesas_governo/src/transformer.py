@@ -4,6 +4,8 @@ import pandas as pd
 import zipfile
 from io import BytesIO
 
+import csv_reader
+from br_parsers import parse_date, parse_decimal
 from loader import Loader
 
 
@@ -14,7 +16,7 @@ class Transformer(Loader):
     def __init__(self, year: str, month: str, day: str):
         self.bucket = "linker-etl"
         self.download_path = f"raw/despesas_governo_federal/{year}{month}{day}.zip"
-        self.upload_path = f"processed/despesas_governo_federal/{self.specific_set}/{year}{month}{day}.csv"
+        self.upload_path = f"processed/despesas_governo_federal/{self.specific_set}/{year}{month}{day}.csv.zst"
         self.year, self.month, self.day = year, month, day
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -48,9 +50,9 @@ class Transformer(Loader):
                 with zf.open(
                     f"{self.year}{self.month}{self.day}_{self.raw_file_name}"
                 ) as file:
-                    return pd.read_csv(
-                        file, dtype="str", sep=";", encoding="iso-8859-1"
-                    )
+                    # órgão, unidade gestora, função etc. repeat across the
+                    # day's rows and are parsed as categoricals
+                    return csv_reader.read_csv(file, auto_dictionary=True)
         else:
             print(f"Unsuccessful S3 get_object response. Status - {status}")
             raise ValueError("Unsuccessful S3 get_object response")
@@ -134,18 +136,10 @@ class Empenho(Transformer):
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         df.columns = self.column_order
-        df["data_emissao"] = pd.to_datetime(df["data_emissao"], format="%d/%m/%Y")
-        df["valor_original_do_empenho"] = (
-            df["valor_original_do_empenho"].str.replace(",", ".").astype(float)
-        )
-        df["valor_do_empenho_convertido_pra_real"] = (
-            df["valor_do_empenho_convertido_pra_real"]
-            .str.replace(",", ".")
-            .astype(float)
-        )
-        df["valor_utilizado_na_conversao"] = (
-            df["valor_utilizado_na_conversao"].str.replace(",", ".").astype(float)
-        )
+        df["data_emissao"] = parse_date(df["data_emissao"])
+        df["valor_original_do_empenho"] = parse_decimal(df["valor_original_do_empenho"])
+        df["valor_do_empenho_convertido_pra_real"] = parse_decimal(df["valor_do_empenho_convertido_pra_real"])
+        df["valor_utilizado_na_conversao"] = parse_decimal(df["valor_utilizado_na_conversao"])
 
         return df
 
@@ -186,7 +180,7 @@ class Liquidacao(Transformer):
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         df.columns = self.column_order
-        df["data_emissao"] = pd.to_datetime(df["data_emissao"], format="%d/%m/%Y")
+        df["data_emissao"] = parse_date(df["data_emissao"])
 
         return df
 
@@ -232,18 +226,10 @@ class Pagamento(Transformer):
     ]
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         df.columns = self.column_order
-        df["data_emissao"] = pd.to_datetime(df["data_emissao"], format="%d/%m/%Y")
-        df["valor_original_do_pagamento"] = (
-            df["valor_original_do_pagamento"].str.replace(",", ".").astype(float)
-        )
-        df["valor_do_pagamento_convertido_pra_real"] = (
-            df["valor_do_pagamento_convertido_pra_real"]
-            .str.replace(",", ".")
-            .astype(float)
-        )
-        df["valor_utilizado_na_conversao"] = (
-            df["valor_utilizado_na_conversao"].str.replace(",", ".").astype(float)
-        )
+        df["data_emissao"] = parse_date(df["data_emissao"])
+        df["valor_original_do_pagamento"] = parse_decimal(df["valor_original_do_pagamento"])
+        df["valor_do_pagamento_convertido_pra_real"] = parse_decimal(df["valor_do_pagamento_convertido_pra_real"])
+        df["valor_utilizado_na_conversao"] = parse_decimal(df["valor_utilizado_na_conversao"])
 
         return df
 
@@ -255,4 +241,11 @@ def transform(specific_set: str, year: str, month: str, day: str):
     elif specific_set == "pagamento":
         Pagamento(year, month, day).run()
     else:
-        raise ValueError("specific_set must be one of: empenho, liquidacao, pagamento")
\ No newline at end of file
+        raise ValueError("specific_set must be one of: empenho, liquidacao, pagamento")
+
+
+TRANSFORMERS = {
+    "empenho": Empenho,
+    "liquidacao": Liquidacao,
+    "pagamento": Pagamento,
+}
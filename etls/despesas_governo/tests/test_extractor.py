@@ -0,0 +1,151 @@
+"""despesas_governo extractor tests."""
+import pytest
+import requests
+
+import extractor
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200, etag=None, last_modified=None, content_range=None, fail_after=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = {}
+        if etag:
+            self.headers["ETag"] = etag
+        if last_modified:
+            self.headers["Last-Modified"] = last_modified
+        if content_range:
+            self.headers["Content-Range"] = content_range
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size):
+        end = len(self.body) if self.fail_after is None else self.fail_after
+        for start in range(0, end, chunk_size):
+            yield self.body[start:min(start + chunk_size, end)]
+        if self.fail_after is not None:
+            raise requests.ConnectionError("connection dropped")
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeUpload:
+    """In-memory MultipartUpload, recording what was completed and aborted"""
+    completed = {}
+    aborted = []
+
+    def __init__(self, bucket, object_path):
+        self.object_path = object_path
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+    def close(self):
+        FakeUpload.completed[self.object_path] = bytes(self.data)
+        self.closed = True
+
+    def abort(self):
+        FakeUpload.aborted.append(bytes(self.data))
+        self.closed = True
+
+
+def serve_range(body, requests_sent, **kwargs):
+    """http_client.get that answers Range requests with the matching 206"""
+    def get(url, headers, stream):
+        requests_sent.append(headers)
+        start = int(headers["Range"][len("bytes="):-1])
+        content_range = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        return FakeResponse(body[start:], status_code=206, content_range=content_range, **kwargs)
+    return get
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    FakeUpload.completed, FakeUpload.aborted = {}, []
+    monkeypatch.setattr(extractor, "MultipartUpload", FakeUpload)
+    monkeypatch.setattr(extractor, "DOWNLOAD_BLOCK_SIZE", 10)
+    return FakeUpload
+
+
+def test_resume_appends_the_requested_range(uploads, monkeypatch):
+    body = bytes(range(100))
+    requests_sent = []
+    monkeypatch.setattr(extractor.http_client, "get", serve_range(body, requests_sent))
+    first = FakeResponse(body, etag='"v1"', fail_after=40)
+    extractor.Extractor("2023", "01", "02").stream_to_s3(first, "raw/x.zip", {})
+
+    assert requests_sent == [{"If-Range": '"v1"', "Range": "bytes=40-"}]
+    assert uploads.completed["raw/x.zip"] == body
+    assert uploads.aborted == []
+
+
+def test_changed_file_restarts_the_upload(uploads, monkeypatch):
+    old_body, new_body = b"a" * 100, b"b" * 120
+
+    def get(url, headers, stream):
+        # If-Range no longer matches: the server sends the new file whole
+        assert headers["If-Range"] == '"v1"'
+        return FakeResponse(new_body, status_code=200, etag='"v2"')
+
+    monkeypatch.setattr(extractor.http_client, "get", get)
+    first = FakeResponse(old_body, etag='"v1"', fail_after=40)
+    extractor.Extractor("2023", "01", "02").stream_to_s3(first, "raw/x.zip", {})
+
+    assert uploads.completed["raw/x.zip"] == new_body
+    assert uploads.aborted == [old_body[:40]]
+
+
+def test_failed_download_aborts_the_upload(uploads, monkeypatch):
+    monkeypatch.setattr(extractor, "MAX_RESUMES", 1)
+    monkeypatch.setattr(extractor.http_client, "get", serve_range(b"x" * 50, [], fail_after=10))
+    first = FakeResponse(b"x" * 50, etag='"v1"', fail_after=10)
+    with pytest.raises(requests.ConnectionError):
+        extractor.Extractor("2023", "01", "02").stream_to_s3(first, "raw/x.zip", {})
+
+    assert uploads.completed == {}
+    assert len(uploads.aborted) == 1
+
+
+def test_resume_falls_back_to_last_modified(uploads, monkeypatch):
+    body = bytes(range(100))
+    requests_sent = []
+    monkeypatch.setattr(extractor.http_client, "get", serve_range(body, requests_sent))
+    first = FakeResponse(body, last_modified="Mon, 02 Jan 2023 10:00:00 GMT", fail_after=40)
+    extractor.Extractor("2023", "01", "02").stream_to_s3(first, "raw/x.zip", {})
+
+    assert requests_sent == [{"If-Range": "Mon, 02 Jan 2023 10:00:00 GMT", "Range": "bytes=40-"}]
+    assert uploads.completed["raw/x.zip"] == body
+
+
+def test_without_validators_the_download_starts_over(uploads, monkeypatch):
+    old_body, new_body = b"a" * 100, b"b" * 120
+    requests_sent = []
+
+    def get(url, headers, stream):
+        requests_sent.append(headers)
+        return FakeResponse(new_body)
+
+    monkeypatch.setattr(extractor.http_client, "get", get)
+    extractor.Extractor("2023", "01", "02").stream_to_s3(FakeResponse(old_body, fail_after=40), "raw/x.zip", {})
+
+    # A plain Range request could splice bytes of a newer file onto the old ones
+    assert requests_sent == [{}]
+    assert uploads.completed["raw/x.zip"] == new_body
+    assert uploads.aborted == [old_body[:40]]
+
+
+def test_mismatched_content_range_is_rejected(uploads, monkeypatch):
+    body = bytes(range(100))
+
+    def get(url, headers, stream):
+        return FakeResponse(body[30:], status_code=206, content_range="bytes 30-99/100")
+
+    monkeypatch.setattr(extractor.http_client, "get", get)
+    with pytest.raises(ValueError, match="starts at byte 30, expected 40"):
+        extractor.Extractor("2023", "01", "02").stream_to_s3(FakeResponse(body, etag='"v1"', fail_after=40), "raw/x.zip", {})
+
+    assert uploads.completed == {}
+    assert uploads.aborted == [body[:40]]
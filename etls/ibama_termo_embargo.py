@@ -1,95 +1,108 @@
-import requests
+from typing import Iterator
+
+import ijson
 import pandas as pd
 
-from clickhouse_driver import Client
+from artifact_cache import Artifact, ArtifactCache
+from clickhouse_sink import ClickHouseSink
+
+URL = "https://dadosabertos.ibama.gov.br/dados/SIFISC/termo_embargo/termo_embargo/termo_embargo.json"
+
+# Records per frame sent to ClickHouse. Bounds memory regardless of the file size,
+# which is dominated by the GEOM_AREA_EMBARGADA polygons.
+BATCH_SIZE = 20_000
+
+COLUMNS = [
+    "SEQ_TAD",
+    "DES_STATUS_FORMULARIO",
+    "DES_STATUS_FORMULARIO_AIE",
+    "SIT_CANCELADO",
+    "NUM_TAD",
+    "SER_TAD",
+    "COD_SUBSTITUICAO",
+    "DAT_EMBARGO",
+    "DAT_IMPRESSAO",
+    "FORMA_ENTREGA",
+    "NUM_PESSOA_EMBARGO",
+    "NOME_EMBARGADO",
+    "CPF_CNPJ_EMBARGADO",
+    "NUM_PROCESSO",
+    "DES_TAD",
+    "COD_MUNICIPIO",
+    "MUNICIPIO",
+    "UF",
+    "DES_LOCALIZACAO",
+    "NUM_LONGITUDE_TAD",
+    "NUM_LATITUDE_TAD",
+    "DETER_PRODES",
+    "ID_POLIGONO",
+    "EMBARGA_POLIGONO",
+    "QTD_AREA_EMBARGADA",
+    "NOME_IMOVEL",
+    "TIPO_AREA",
+    "GEOM_AREA_EMBARGADA",
+    "DAT_ULT_ALTER_GEOM",
+    "UNID_APRESENTACAO",
+    "UNID_CONTROLE",
+    "SIT_DESEMBARGO",
+    "TIPO_DESEMBARGO",
+    "DAT_DESEMBARGO",
+    "DES_DESEMBARGO",
+    "SEQ_AUTO_INFRACAO",
+    "NUM_AUTO_INFRACAO",
+    "SEQ_NOTIFICACAO",
+    "SEQ_ACAO_FISCALIZATORIA",
+    "CD_ACAO_FISCALIZATORIA",
+    "OPERACAO",
+    "SEQ_ORDEM_FISCALIZACAO",
+    "ORDEM_FISCALIZACAO",
+    "UNID_ORDENADORA",
+    "SEQ_SOLICITACAO_RECURSO",
+    "SOLICITACAO_RECURSO",
+    "OPERACAO_SOL_RECURSO",
+    "DAT_ULT_ALTERACAO",
+    "TIPO_ALTERACAO",
+    "JUSTIFICATIVA_ALTERACAO",
+    "ULTIMA_ATUALIZACAO_RELATORIO",
+]
 
-def extract_file():
+
+def extract_file(artifact: Artifact, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
     """
-    Extracts the file from the url and uploads it to the bucket
+    Streams the records of the `data` array in termo_embargo.json, keeping only
+    the loaded fields, and yields them in frames of at most `batch_size` rows
     """
-    url = "https://dadosabertos.ibama.gov.br/dados/SIFISC/termo_embargo/termo_embargo/termo_embargo.json"
-
-    response = requests.get(url, verify=False)
-
-    df = pd.DataFrame(response.json()["data"], dtype=str)
-
-    df = df[
-        [
-            "SEQ_TAD",
-            "DES_STATUS_FORMULARIO",
-            "DES_STATUS_FORMULARIO_AIE",
-            "SIT_CANCELADO",
-            "NUM_TAD",
-            "SER_TAD",
-            "COD_SUBSTITUICAO",
-            "DAT_EMBARGO",
-            "DAT_IMPRESSAO",
-            "FORMA_ENTREGA",
-            "NUM_PESSOA_EMBARGO",
-            "NOME_EMBARGADO",
-            "CPF_CNPJ_EMBARGADO",
-            "NUM_PROCESSO",
-            "DES_TAD",
-            "COD_MUNICIPIO",
-            "MUNICIPIO",
-            "UF",
-            "DES_LOCALIZACAO",
-            "NUM_LONGITUDE_TAD",
-            "NUM_LATITUDE_TAD",
-            "DETER_PRODES",
-            "ID_POLIGONO",
-            "EMBARGA_POLIGONO",
-            "QTD_AREA_EMBARGADA",
-            "NOME_IMOVEL",
-            "TIPO_AREA",
-            "GEOM_AREA_EMBARGADA",
-            "DAT_ULT_ALTER_GEOM",
-            "UNID_APRESENTACAO",
-            "UNID_CONTROLE",
-            "SIT_DESEMBARGO",
-            "TIPO_DESEMBARGO",
-            "DAT_DESEMBARGO",
-            "DES_DESEMBARGO",
-            "SEQ_AUTO_INFRACAO",
-            "NUM_AUTO_INFRACAO",
-            "SEQ_NOTIFICACAO",
-            "SEQ_ACAO_FISCALIZATORIA",
-            "CD_ACAO_FISCALIZATORIA",
-            "OPERACAO",
-            "SEQ_ORDEM_FISCALIZACAO",
-            "ORDEM_FISCALIZACAO",
-            "UNID_ORDENADORA",
-            "SEQ_SOLICITACAO_RECURSO",
-            "SOLICITACAO_RECURSO",
-            "OPERACAO_SOL_RECURSO",
-            "DAT_ULT_ALTERACAO",
-            "TIPO_ALTERACAO",
-            "JUSTIFICATIVA_ALTERACAO",
-            "ULTIMA_ATUALIZACAO_RELATORIO",
-        ]
-    ]
-
-    df.columns = [c.lower() for c in df.columns]
-
-    return df
+    batch = {column: [] for column in COLUMNS}
+    rows = 0
+
+    for record in ijson.items(artifact.open(), "data.item"):
+        for column in COLUMNS:
+            value = record.get(column)
+            batch[column].append("" if value is None else str(value))
+        rows += 1
+
+        if rows == batch_size:
+            yield pd.DataFrame({column.lower(): values for column, values in batch.items()})
+            batch = {column: [] for column in COLUMNS}
+            rows = 0
+
+    if rows:
+        yield pd.DataFrame({column.lower(): values for column, values in batch.items()})
 
 
 def run():
 
-    final_df = extract_file()
+    cache = ArtifactCache()
+    artifact = cache.fetch(URL, verify=False)
 
-    connection = dict(database='ibama',
-                  host='data-warehouse',
-                  user='admin',
-                  password='admin')
+    if not artifact.changed:
+        print("Termo de embargo file unchanged since the last run")
+        return
 
-    client = Client(**connection)
+    # Frames are parsed from the JSON stream while earlier blocks are inserted
+    ClickHouseSink("ibama", "termo_embargo", block_rows=BATCH_SIZE, streams=2).replace(extract_file(artifact))
 
-    client.insert_dataframe(
-        'INSERT INTO "termo_embargo" VALUES',
-        final_df,
-        settings=dict(use_numpy=True),
-    )
+    cache.commit(artifact)
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
@@ -1,11 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from io import StringIO
 
 import pandas as pd
-import requests
 
+import http_client
 from loader import Loader
 
+# Concurrent requests to BCB and SUSEP during extraction
+MAX_WORKERS = 8
+
 
 class FinancialInstitutionsExtractor(Loader):
     '''
@@ -22,7 +26,7 @@ class FinancialInstitutionsExtractor(Loader):
         '''
         Extrai todos os segmentos
         '''
-        return requests.get(self.segment_URL).json()
+        return http_client.get(self.segment_URL).json()
 
     def get_data_by_segment(self, segment_dict: dict) -> pd.DataFrame:
         '''
@@ -32,7 +36,7 @@ class FinancialInstitutionsExtractor(Loader):
             'seg': str(segment_dict['id']),
         }
 
-        response = requests.get(self.base_cnpjs_URL, params=params)
+        response = http_client.get(self.base_cnpjs_URL, params=params)
         df = pd.read_csv(StringIO(response.text), skiprows=7, sep=';', dtype={'CNPJ': str})
 
         df['CNPJ'] = df['CNPJ'].str.zfill(8)
@@ -55,7 +59,7 @@ class InsuranceInstitutionsExtractor(Loader):
         '''
         Extrai todos os segmentos
         '''
-        return {x['Codigo']: x['Descricao'] for x in requests.get(self.market_types_URL, verify=False).json()['value']}
+        return {x['Codigo']: x['Descricao'] for x in http_client.get(self.market_types_URL, verify=False).json()['value']}
 
     def get_data(self) -> pd.DataFrame:
         '''
@@ -64,20 +68,26 @@ class InsuranceInstitutionsExtractor(Loader):
 
         market_types_dict = self.get_market_types()
 
-        companies = requests.get(self.cnpjs_URL, verify=False).json()['value']
+        companies = http_client.get(self.cnpjs_URL, verify=False).json()['value']
         df = pd.DataFrame(companies)
 
         df['tipo_mercado'] = df['mercodigo'].map(market_types_dict)
         return df
 
 
-def extract():
+def extract(max_workers: int = MAX_WORKERS):
     financial_institutions = FinancialInstitutionsExtractor()
     insurance_institutions = InsuranceInstitutionsExtractor()
-    df_fi = pd.concat([financial_institutions.get_data_by_segment(segment_dict)
-                       for segment_dict in financial_institutions.get_segments()
-                       if segment_dict['nome'] != ''])
-    df_ii = insurance_institutions.get_data()
+
+    # Each segment is a separate request parsed in its own worker, and SUSEP does
+    # not wait behind the BCB segments
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_ii = executor.submit(insurance_institutions.get_data)
+        futures_fi = [executor.submit(financial_institutions.get_data_by_segment, segment_dict)
+                      for segment_dict in financial_institutions.get_segments()
+                      if segment_dict['nome'] != '']
+        df_fi = pd.concat([future.result() for future in futures_fi])
+        df_ii = future_ii.result()
     financial_institutions.upload_file(df_fi, financial_institutions.bucket, financial_institutions.file_name)
     insurance_institutions.upload_file(df_ii, insurance_institutions.bucket, insurance_institutions.file_name)
 
@@ -1,10 +1,12 @@
 from extractor import extract
+import http_client
 from loader import load
 from transformer import transform
 
 
 def lambda_handler(event=None, context=None):
     extract()
+    http_client.print_stats()
     transform()
     load()
 
@@ -3,6 +3,7 @@ from datetime import datetime, date
 import pandas as pd
 
 from loader import Loader
+from text_normalization import normalize_str_series
 
 
 class InstituicoesFinanceirasTransformer(Loader):
@@ -11,19 +12,9 @@ class InstituicoesFinanceirasTransformer(Loader):
         self.bucket = 'linker-etl'
         self.bacen_download_path = f'raw/instituicoes_financeiras/bacen/{datetime.today().strftime("%Y-%m-%d")}.csv'
         self.susep_download_path = f'raw/instituicoes_financeiras/susep/{datetime.today().strftime("%Y-%m-%d")}.csv'
-        self.base_upload_path = f'processed/instituicoes_financeiras/{datetime.today().strftime("%Y-%m-%d")}.csv'
+        self.base_upload_path = f'processed/instituicoes_financeiras/{datetime.today().strftime("%Y-%m-%d")}.csv.zst'
         self.column_order = ['cnpj_raiz', 'segmento', 'data_coleta']
 
-    @staticmethod
-    def normalize_str_series(series: pd.Series) -> pd.Series:
-        return (
-            series.str.strip()
-                .str.upper()
-                .str.normalize("NFKD")
-                .str.encode("ascii", errors="ignore")
-                .str.decode("utf-8")
-        )
-
     def transform(self, df_if: pd.DataFrame, df_ii: pd.DataFrame) -> pd.DataFrame:
         df_if = df_if[['CNPJ', 'SEGMENTO']]
 
@@ -40,7 +31,7 @@ class InstituicoesFinanceirasTransformer(Loader):
         df = pd.concat([df_if, df_ii])
 
         df['data_coleta'] = date.today()
-        df['segmento'] = self.normalize_str_series(df['segmento'])
+        df['segmento'] = normalize_str_series(df['segmento'])
 
         df = df[df['cnpj_raiz'].ne('') & df['cnpj_raiz'].notna()].drop_duplicates()
 
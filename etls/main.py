@@ -1,4 +1,5 @@
 import beneficios_sociais
+import http_client
 import ibama_termo_embargo
 import pep
 import punicao
@@ -9,4 +10,5 @@ def run():
     ibama_termo_embargo.run()
     pep.run()
     punicao.run()
-    rab.run()
\ No newline at end of file
+    rab.run()
+    http_client.print_stats()
\ No newline at end of file
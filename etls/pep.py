@@ -1,11 +1,16 @@
 import re
 import pandas as pd
-import requests
+import http_client
+import csv_reader
+from br_parsers import parse_date
+from documents import only_digits
+from text_normalization import normalize_str_series
 from zipfile import ZipFile
-import io
 from lxml import html
 
-from clickhouse_drive import Client
+from artifact_cache import Artifact, ArtifactCache
+
+from clickhouse_sink import ClickHouseSink
 from datetime import datetime
 
 
@@ -22,35 +27,26 @@ COLUMN_ORDER = [
             "data_coleta",
         ]
 
+# Columns of the portal's file used by transform, the only ones parsed
+SOURCE_COLUMNS = [
+    "CPF",
+    "Nome_PEP",
+    "Sigla_Função",
+    "Descrição_Função",
+    "Nível_Função",
+    "Nome_Órgão",
+    "Data_Início_Exercício",
+    "Data_Fim_Exercício",
+    "Data_Fim_Carência",
+]
+
 
 def reorder_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df[COLUMN_ORDER]
 
 
-def normalize_str_series(series: pd.Series) -> pd.Series:
-    return (
-        series.str.strip()
-        .str.upper()
-        .str.normalize("NFKD")
-        .str.encode("ascii", errors="ignore")
-        .str.decode("utf-8")
-    )
-
-
 def transform(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[
-        [
-            "CPF",
-            "Nome_PEP",
-            "Sigla_Função",
-            "Descrição_Função",
-            "Nível_Função",
-            "Nome_Órgão",
-            "Data_Início_Exercício",
-            "Data_Fim_Exercício",
-            "Data_Fim_Carência",
-        ]
-    ]
+    df = df[SOURCE_COLUMNS]
 
     df = df.rename(
         columns={
@@ -67,22 +63,14 @@ def transform(df: pd.DataFrame) -> pd.DataFrame:
     )
 
     df["data_coleta"] = datetime.today().date()
-    df["data_inicio_exercicio"] = pd.to_datetime(
-        df["data_inicio_exercicio"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["data_fim_exercicio"] = pd.to_datetime(
-        df["data_fim_exercicio"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["data_fim_carencia"] = pd.to_datetime(
-        df["data_fim_carencia"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["data_inicio_exercicio"] = parse_date(df["data_inicio_exercicio"], errors="coerce")
+    df["data_fim_exercicio"] = parse_date(df["data_fim_exercicio"], errors="coerce")
+    df["data_fim_carencia"] = parse_date(df["data_fim_carencia"], errors="coerce")
     df["nome"] = normalize_str_series(df["nome"])
     df["sigla_funcao"] = normalize_str_series(df["sigla_funcao"])
     df["descricao_funcao"] = normalize_str_series(df["descricao_funcao"])
     df["nome_orgao"] = normalize_str_series(df["nome_orgao"])
-    df["cpf_mascarado"] = df["cpf_mascarado"].apply(
-        lambda cpf: "".join([c for c in cpf if c.isnumeric() or c == "*"])
-    )
+    df["cpf_mascarado"] = only_digits(df["cpf_mascarado"], extra="*")
     df["cpf_mascarado_prefix"] = df["cpf_mascarado"].str[:6].str.replace("*", "")
 
     return reorder_columns(df)
@@ -102,7 +90,7 @@ def get_csv_url(initial_url: str) -> str:
         "Connection": "keep-alive",
     }
 
-    response = requests.get(initial_url, headers=headers)
+    response = http_client.get(initial_url, headers=headers)
     doc = html.fromstring(response.content)
     path = "//script"
     date_pattern = re.compile(
@@ -117,18 +105,24 @@ def get_csv_url(initial_url: str) -> str:
                 return initial_url + f"/{year}{month}"
 
 
-def get_csv(base_url: str) -> pd.DataFrame:
+def download_csv(base_url: str, cache: ArtifactCache) -> Artifact:
     URL = get_csv_url(base_url)
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
-    r = requests.get(URL, headers=headers)
-    z = ZipFile(io.BytesIO(r.content))
+    # the URL carries the publication month, so the base URL identifies the source
+    return cache.fetch(URL, key=base_url, headers=headers)
+
+
+def get_csv(artifact: Artifact) -> pd.DataFrame:
+    z = ZipFile(artifact.open())
 
     file_name = z.namelist()[0]
 
-    df = pd.read_csv(
-        io.BytesIO(z.read(file_name)), sep=";", encoding="iso-8859-1", dtype="str"
+    df = csv_reader.read_csv(
+        z.open(file_name),
+        columns=SOURCE_COLUMNS,
+        dictionary_columns=["Sigla_Função", "Nível_Função", "Nome_Órgão"],
     )
 
     return df
@@ -136,20 +130,18 @@ def get_csv(base_url: str) -> pd.DataFrame:
 
 def run():
 
-    final_df = transform(get_csv("https://portaldatransparencia.gov.br/download-de-dados/pep"))
+    cache = ArtifactCache()
+    artifact = download_csv("https://portaldatransparencia.gov.br/download-de-dados/pep", cache)
 
-    connection = dict(database='transparencia',
-                  host='data-warehouse',
-                  user='admin',
-                  password='admin')
+    if not artifact.changed:
+        print("PEP file unchanged since the last run")
+        return
 
-    client = Client(**connection)
+    final_df = transform(get_csv(artifact))
 
-    client.insert_dataframe(
-        'INSERT INTO "pessoa_exposta_politicamente" VALUES',
-        final_df,
-        settings=dict(use_numpy=True),
-    )
+    ClickHouseSink("transparencia", "pessoa_exposta_politicamente").replace(final_df)
+
+    cache.commit(artifact)
 
 if __name__ == "__main__":
     run()
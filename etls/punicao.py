@@ -1,11 +1,15 @@
 import json
 import pandas as pd
-import requests
+import http_client
+import csv_reader
+from br_parsers import parse_date
 from zipfile import ZipFile
-import io
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 import transformer
 
-from clickhouse_drive import Client
+from artifact_cache import Artifact, ArtifactCache
+
+from clickhouse_sink import ClickHouseSink
 import datetime
 
 import numpy as np
@@ -25,23 +29,42 @@ COLUMN_ORDER = [
     "data_coleta",
 ]
 
+# Low-cardinality columns of the sanction bases, parsed as categoricals
+DICTIONARY_COLUMNS = [
+    "TIPO DE PESSOA",
+    "ÓRGÃO SANCIONADOR",
+    "UF ÓRGÃO SANCIONADOR",
+    "ÓRGÃO CONCEDENTE",
+]
+
+
+# Columns of each base used by its transform, the only ones parsed from the file
+CNEP_COLUMNS = [
+    "CPF OU CNPJ DO SANCIONADO",
+    "TIPO DE PESSOA",
+    "ÓRGÃO SANCIONADOR",
+    "UF ÓRGÃO SANCIONADOR",
+    "FUNDAMENTAÇÃO LEGAL",
+    "DATA INÍCIO SANÇÃO",
+    "DATA FINAL SANÇÃO",
+]
+# CEIS and CEAF
+SANCTION_COLUMNS = CNEP_COLUMNS + ["ABRAGÊNCIA DEFINIDA EM DECISÃO JUDICIAL"]
+CEPIM_COLUMNS = ["CNPJ ENTIDADE", "ÓRGÃO CONCEDENTE", "MOTIVO DO IMPEDIMENTO"]
+AL_COLUMNS = [
+    "CNPJ DO SANCIONADO",
+    "ÓRGÃO SANCIONADOR",
+    "DATA DE INÍCIO DO ACORDO",
+    "DATA DE FIM DO ACORDO",
+]
+
 
 def reorder_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df[COLUMN_ORDER]
 
 
 def transform_cnep(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[
-        [
-            "CPF OU CNPJ DO SANCIONADO",
-            "TIPO DE PESSOA",
-            "ÓRGÃO SANCIONADOR",
-            "UF ÓRGÃO SANCIONADOR",
-            "FUNDAMENTAÇÃO LEGAL",
-            "DATA INÍCIO SANÇÃO",
-            "DATA FINAL SANÇÃO",
-        ]
-    ]
+    df = df[CNEP_COLUMNS]
 
     df = df.rename(
         columns={
@@ -60,18 +83,14 @@ def transform_cnep(df: pd.DataFrame) -> pd.DataFrame:
     df["observacoes"] = np.nan
     df["base_origem"] = "CNEP"
     df["data_coleta"] = datetime.date.today()
-    df["inicio_punicao"] = pd.to_datetime(
-        df["inicio_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["fim_punicao"] = pd.to_datetime(
-        df["fim_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["inicio_punicao"] = parse_date(df["inicio_punicao"], errors="coerce")
+    df["fim_punicao"] = parse_date(df["fim_punicao"], errors="coerce")
 
     return reorder_columns(df)
 
 
 def transform_cepim(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[["CNPJ ENTIDADE", "ÓRGÃO CONCEDENTE", "MOTIVO DO IMPEDIMENTO"]]
+    df = df[CEPIM_COLUMNS]
 
     df = df.rename(
         columns={
@@ -90,29 +109,14 @@ def transform_cepim(df: pd.DataFrame) -> pd.DataFrame:
     df["observacoes"] = np.nan
     df["base_origem"] = "CEPIM"
     df["data_coleta"] = datetime.date.today()
-    df["inicio_punicao"] = pd.to_datetime(
-        df["inicio_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["fim_punicao"] = pd.to_datetime(
-        df["fim_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["inicio_punicao"] = parse_date(df["inicio_punicao"], errors="coerce")
+    df["fim_punicao"] = parse_date(df["fim_punicao"], errors="coerce")
 
     return reorder_columns(df)
 
 
 def transform_ceis(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[
-        [
-            "CPF OU CNPJ DO SANCIONADO",
-            "TIPO DE PESSOA",
-            "ÓRGÃO SANCIONADOR",
-            "UF ÓRGÃO SANCIONADOR",
-            "FUNDAMENTAÇÃO LEGAL",
-            "DATA INÍCIO SANÇÃO",
-            "DATA FINAL SANÇÃO",
-            "ABRAGÊNCIA DEFINIDA EM DECISÃO JUDICIAL",
-        ]
-    ]
+    df = df[SANCTION_COLUMNS]
 
     df = df.rename(
         columns={
@@ -132,29 +136,14 @@ def transform_ceis(df: pd.DataFrame) -> pd.DataFrame:
     df["tipo_punicao"] = np.nan
     df["observacoes"] = np.nan
     df["data_coleta"] = datetime.date.today()
-    df["inicio_punicao"] = pd.to_datetime(
-        df["inicio_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["fim_punicao"] = pd.to_datetime(
-        df["fim_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["inicio_punicao"] = parse_date(df["inicio_punicao"], errors="coerce")
+    df["fim_punicao"] = parse_date(df["fim_punicao"], errors="coerce")
 
     return reorder_columns(df)
 
 
 def transform_ceaf(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[
-        [
-            "CPF OU CNPJ DO SANCIONADO",
-            "TIPO DE PESSOA",
-            "ÓRGÃO SANCIONADOR",
-            "UF ÓRGÃO SANCIONADOR",
-            "FUNDAMENTAÇÃO LEGAL",
-            "DATA INÍCIO SANÇÃO",
-            "DATA FINAL SANÇÃO",
-            "ABRAGÊNCIA DEFINIDA EM DECISÃO JUDICIAL",
-        ]
-    ]
+    df = df[SANCTION_COLUMNS]
 
     df = df.rename(
         columns={
@@ -173,25 +162,14 @@ def transform_ceaf(df: pd.DataFrame) -> pd.DataFrame:
     df["tipo_punicao"] = np.nan
     df["observacoes"] = np.nan
     df["data_coleta"] = datetime.date.today()
-    df["inicio_punicao"] = pd.to_datetime(
-        df["inicio_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["fim_punicao"] = pd.to_datetime(
-        df["fim_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["inicio_punicao"] = parse_date(df["inicio_punicao"], errors="coerce")
+    df["fim_punicao"] = parse_date(df["fim_punicao"], errors="coerce")
 
     return reorder_columns(df)
 
 
 def transform_al(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[
-        [
-            "CNPJ DO SANCIONADO",
-            "ÓRGÃO SANCIONADOR",
-            "DATA DE INÍCIO DO ACORDO",
-            "DATA DE FIM DO ACORDO",
-        ]
-    ]
+    df = df[AL_COLUMNS]
 
     df = df.rename(
         columns={
@@ -211,12 +189,8 @@ def transform_al(df: pd.DataFrame) -> pd.DataFrame:
     df["tipo_punicao"] = np.nan
     df["observacoes"] = np.nan
     df["data_coleta"] = datetime.date.today()
-    df["inicio_punicao"] = pd.to_datetime(
-        df["inicio_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
-    df["fim_punicao"] = pd.to_datetime(
-        df["fim_punicao"], format="%d/%m/%Y", errors="coerce"
-    )
+    df["inicio_punicao"] = parse_date(df["inicio_punicao"], errors="coerce")
+    df["fim_punicao"] = parse_date(df["fim_punicao"], errors="coerce")
 
     return reorder_columns(df)
 
@@ -235,7 +209,7 @@ def get_csv_url(initial_url: str) -> str:
         "Connection": "keep-alive",
     }
 
-    response = requests.get(
+    response = http_client.get(
         initial_url,
         headers=headers,
     )
@@ -253,19 +227,21 @@ def get_csv_url(initial_url: str) -> str:
     )
 
 
-def get_csv(base_url: str) -> pd.DataFrame:
+def download_csv(base_url: str, cache: ArtifactCache) -> Artifact:
     URL = get_csv_url(base_url)
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
-    r = requests.get(URL, headers=headers)
-    z = ZipFile(io.BytesIO(r.content))
+    # the URL carries the publication date, so the base URL identifies the source
+    return cache.fetch(URL, key=base_url, headers=headers)
+
+
+def get_csv(f, columns=None) -> pd.DataFrame:
+    z = ZipFile(f)
 
     file_name = z.namelist()[0]
 
-    df = pd.read_csv(
-        io.BytesIO(z.read(file_name)), sep=";", encoding="iso-8859-1", dtype="str"
-    )
+    df = csv_reader.read_csv(z.open(file_name), columns=columns, dictionary_columns=DICTIONARY_COLUMNS)
 
     return df
 
@@ -298,22 +274,62 @@ bases = [
     ),
 ]
 
+COLUMNS = {
+    "CEIS": SANCTION_COLUMNS,
+    "CEPIN": CEPIM_COLUMNS,
+    "CNEP": CNEP_COLUMNS,
+    "AL": AL_COLUMNS,
+    "CEAF": SANCTION_COLUMNS,
+}
 
-def run():
+# base_origem written by each base's transform: the partition its load replaces
+PARTITIONS = {"CEIS": "CEIS", "CEPIN": "CEPIM", "CNEP": "CNEP", "AL": "AL", "CEAF": "CEAF"}
 
-    connection = dict(
-        database="transparencia", host="data-warehouse", user="admin", password="admin"
-    )
 
-    client = Client(**connection)
+def parse_base(name: str, path: str) -> pd.DataFrame:
+    """
+    Reads and transforms one downloaded base from its spooled zip. Runs in a
+    worker process, which opens the file itself instead of receiving its bytes.
+    """
+    transform = {base[0]: base[2] for base in bases}[name]
+    with open(path, "rb") as f:
+        return transform(get_csv(f, COLUMNS[name]))
 
-    final_df = pd.concat([base[2](get_csv(base[1])) for base in bases])
 
-    client.insert_dataframe(
-        'INSERT INTO "punicao" VALUES',
-        final_df,
-        settings=dict(use_numpy=True),
-    )
+def run():
+
+    sink = ClickHouseSink("transparencia", "punicao")
+
+    cache = ArtifactCache()
+
+    # Downloads are I/O bound and share the portal's connection pool, so they run
+    # in threads; parsing and transforming is CPU bound and runs in processes as
+    # soon as each zip arrives. Each base replaces its base_origem partition as
+    # soon as it is ready.
+    with ThreadPoolExecutor(max_workers=len(bases)) as downloads, ProcessPoolExecutor() as parsers:
+        download_futures = {downloads.submit(download_csv, base[1], cache): base for base in bases}
+        parse_futures = {}
+        pending = set(download_futures)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future in download_futures:
+                    base = download_futures[future]
+                    artifact = future.result()
+                    if not artifact.changed:
+                        print(f"{base[0]} unchanged since the last run")
+                        continue
+                    parse_future = parsers.submit(parse_base, base[0], artifact.path)
+                    parse_futures[parse_future] = (base, artifact)
+                    pending.add(parse_future)
+                else:
+                    base, artifact = parse_futures[future]
+                    # An empty snapshot drops the base's partition instead of keeping its old rows
+                    sink.replace_partitions(future.result(), partitions=[PARTITIONS[base[0]]])
+                    cache.commit(artifact)
+                    print(f"{base[0]} inserted")
 
 
 if __name__ == "__main__":
@@ -1,47 +1,54 @@
 import pandas as pd
-import requests
 import json
 from datetime import datetime
 
+from artifact_cache import ArtifactCache
 from loader import Loader
 
 
 class Extractor(Loader):
     bucket: str = "linker-etl"
-    file_name: str = "raw/quadros_bcb/{}.csv".format(datetime.today().strftime("%Y-%m-%d"))
+    file_name: str = "raw/quadros_bcb/{}.csv.zst".format(datetime.today().strftime("%Y-%m-%d"))
     def __init__(self) -> None:
         self.URL_inabilitados = "https://olinda.bcb.gov.br/olinda/servico/Gepad_QuadrosGeraisInternet/versao/v1/odata/QuadroGeralInabilitados?format=text/csv"
         self.URL_proibidos = "https://olinda.bcb.gov.br/olinda/servico/Gepad_QuadrosGeraisInternet/versao/v1/odata/QuadroGeralProibidos?format=text/html"
 
-    def get_csv(self) -> str:
+    def download(self, cache: ArtifactCache) -> list:
+        return [cache.fetch(self.URL_inabilitados), cache.fetch(self.URL_proibidos)]
 
-        data = []
-        response_inabilitados = requests.get(
-            self.URL_inabilitados,
-        )
+    def get_csv(self, artifacts: list) -> str:
+        artifact_inabilitados, artifact_proibidos = artifacts
 
-        data_inabilitados = json.loads(response_inabilitados.text)
+        data_inabilitados = json.load(artifact_inabilitados.open())
 
         inabilitados = pd.DataFrame(data_inabilitados['value'])
 
         inabilitados = inabilitados.rename(columns={'CPF': 'CPF_CNPJ'})
 
-        response_proibidos = requests.get(
-            self.URL_proibidos,
-        )
-
-        data_proibidos = json.loads(response_proibidos.text)
+        data_proibidos = json.load(artifact_proibidos.open())
 
         proibidos = pd.DataFrame(data_proibidos['value'])
 
         return pd.concat([inabilitados, proibidos])
 
-def extract():
+def extract(cache: ArtifactCache) -> list:
+    """
+    Uploads both lists when either changed upstream and returns the downloaded
+    artifacts, to be committed to the cache after loading. Returns an empty list
+    when nothing changed since the last run.
+    """
     extractor = Extractor()
-    df = extractor.get_csv()
+    artifacts = extractor.download(cache)
+    if not any(artifact.changed for artifact in artifacts):
+        return []
+
+    # the table is rebuilt from both lists, so an unchanged one is read from the cache
+    artifacts = [artifact if artifact.changed else cache.restore(artifact) for artifact in artifacts]
+    df = extractor.get_csv(artifacts)
     df.to_csv('temp.csv', index=False)
     extractor.upload_file(df, extractor.bucket, extractor.file_name)
+    return artifacts
 
 
 if __name__ == "__main__":
-    extract()
+    extract(ArtifactCache())
@@ -1,4 +1,3 @@
-import io
 import json
 import logging
 from datetime import datetime
@@ -8,31 +7,31 @@ import pandas as pd
 import psycopg2
 from botocore.exceptions import ClientError
 
+from s3_staging import copy_format, write_staging
+
 
 class Loader:
     '''
-    Loads csv file in s3
+    Stages dataframes in s3
     '''
 
     def __init__(self) -> None:
         pass
 
-    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None) -> None:
-        """Upload a dataframe as a csv to an S3 bucket
+    def upload_file(self, df: pd.DataFrame, bucket: str, object_path=None, schema=None) -> None:
+        """Upload a dataframe to an S3 bucket, as Parquet or CSV depending on the
+        extension of object_path (see s3_staging)
 
         :param df: Dataframe to upload
         :param bucket: Bucket to upload to
         :param object_path: S3 object path.
+        :param schema: Arrow schema of the target table, required for .parquet
         :return: True if file was uploaded, else False
         """
 
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-
         # Upload the file
-        s3_resource = boto3.resource('s3')
         try:
-            s3_resource.Object(bucket, object_path).put(Body=csv_buffer.getvalue())
+            write_staging(df, bucket, object_path, schema)
         except ClientError as e:
             logging.error(e)
             return False
@@ -66,7 +65,7 @@ class S3_to_Redshift:
 
     def __init__(self) -> None:
         self.redshift_full_table_name = "sistema_financeiro.bcb_inabilitado_proibido"
-        self.s3_uri = f's3://linker-etl/raw/quadros_bcb/{datetime.today().strftime("%Y-%m-%d")}.csv'
+        self.s3_uri = f's3://linker-etl/raw/quadros_bcb/{datetime.today().strftime("%Y-%m-%d")}.csv.zst'
 
     def get_credentials_redshift(self):
         client = boto3.client('secretsmanager')
@@ -98,7 +97,7 @@ class S3_to_Redshift:
         COPY_QUERY = f"""COPY temp
                          FROM '{self.s3_uri}'
                          WITH IAM_ROLE 'arn:aws:iam::345917470638:role/redshiftRole'
-                         FORMAT AS CSV IGNOREHEADER 1;
+                         {copy_format(self.s3_uri)};
         """
         cursor.execute(COPY_QUERY)
 
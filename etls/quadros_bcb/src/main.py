@@ -1,10 +1,19 @@
+from artifact_cache import ArtifactCache
 from extractor import extract
+import http_client
 from loader import load
 
 
 def lambda_handler(event=None, context=None):
-    extract()
+    cache = ArtifactCache()
+    artifacts = extract(cache)
+    http_client.print_stats()
+    if not artifacts:
+        print("Quadros gerais unchanged since the last run")
+        return
     load()
+    for artifact in artifacts:
+        cache.commit(artifact)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+"""
+Staging files for the S3 -> Redshift loads.
+
+A frame is written straight into an S3 multipart upload, a part at a time,
+instead of being rendered whole into a string first. The format follows the
+object path:
+
+- .parquet: zstd-compressed Parquet, converted and written one row group of
+  ROW_GROUP_ROWS rows at a time. COPY ... FORMAT AS PARQUET does not convert
+  types the way CSV does, so it takes an explicit Arrow schema matching the
+  target table, column for column.
+- .csv.zst: zstd-compressed CSV. Redshift parses it as text like plain CSV,
+  so it fits any table.
+- anything else: plain CSV, as before.
+
+`copy_format` gives the matching COPY options for a staged object. This file
+is copied into the src folder of every loader that stages to Redshift; keep
+the copies identical.
+"""
+import boto3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# S3 requires every part but the last to be at least 5 MiB
+PART_SIZE = 8 * 1024 * 1024
+
+ROW_GROUP_ROWS = 500_000
+CSV_CHUNK_ROWS = 100_000
+
+
+class MultipartUpload:
+    """
+    Writable file-like object that streams bytes into an S3 multipart upload,
+    holding at most one part in memory. Used as a context manager, the upload is
+    completed on success and aborted if an exception escapes the block.
+    """
+
+    def __init__(self, bucket: str, object_path: str, part_size: int = PART_SIZE) -> None:
+        self.s3 = boto3.client("s3")
+        self.bucket = bucket
+        self.object_path = object_path
+        self.part_size = part_size
+        self.parts = []
+        self.buffer = bytearray()
+        self.closed = False
+        self.upload_id = self.s3.create_multipart_upload(Bucket=bucket, Key=object_path)["UploadId"]
+
+    def _upload_part(self, body: bytes) -> None:
+        part_number = len(self.parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.object_path,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+            Body=body,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def flush(self) -> None:
+        # Parts are only sent once full; pyarrow flushes its writers through here
+        pass
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.object_path,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+        self.closed = True
+
+    def abort(self) -> None:
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.object_path, UploadId=self.upload_id)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_parquet(df: pd.DataFrame, upload, schema: pa.Schema, row_group_rows: int = ROW_GROUP_ROWS) -> None:
+    """
+    Writes a frame as Parquet with the given schema, converting one row group
+    at a time so only that slice is held in Arrow memory. Raises if a column
+    does not convert to its type.
+    """
+    # Redshift reads timestamps in micro or milliseconds, not the nanoseconds of pandas
+    with pq.ParquetWriter(upload, schema, compression="zstd", coerce_timestamps="us",
+                          allow_truncated_timestamps=True) as writer:
+        for start in range(0, len(df), row_group_rows):
+            chunk = df.iloc[start:start + row_group_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_csv(df: pd.DataFrame, upload, chunk_rows: int = CSV_CHUNK_ROWS) -> None:
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0)
+        upload.write(chunk.encode("utf-8"))
+
+
+def write_staging(df: pd.DataFrame, bucket: str, object_path: str, schema: pa.Schema = None) -> None:
+    """
+    Uploads a frame to S3 in the format given by the extension of the object
+    path. A failed upload is aborted and leaves no object behind.
+
+    :param schema: Arrow schema of the target table, required for .parquet
+    """
+    if object_path.endswith(".parquet") and schema is None:
+        raise ValueError(f"Staging {object_path} as Parquet needs the schema of the target table")
+
+    with MultipartUpload(bucket, object_path) as upload:
+        if object_path.endswith(".parquet"):
+            write_parquet(df, upload, schema)
+        elif object_path.endswith(".zst"):
+            # Closed by hand: closing it also completes the upload, which must not
+            # happen when the write fails
+            compressed = pa.CompressedOutputStream(upload, "zstd")
+            write_csv(df, compressed)
+            compressed.close()
+        else:
+            write_csv(df, upload)
+
+
+def copy_format(s3_uri: str) -> str:
+    """COPY format options for an object staged by write_staging"""
+    if s3_uri.endswith(".parquet"):
+        return "FORMAT AS PARQUET"
+    if s3_uri.endswith(".zst"):
+        return "FORMAT AS CSV IGNOREHEADER 1 ZSTD"
+    return "FORMAT AS CSV IGNOREHEADER 1"
@@ -1,64 +1,45 @@
-import requests
 import pandas as pd
-import io
-from clickhouse_drive import Client
 
+from artifact_cache import Artifact, ArtifactCache
+from clickhouse_sink import ClickHouseSink
+from documents import strip_chars
+from text_normalization import normalize_str_series
 
-def normalize_str_series(series: pd.Series) -> pd.Series:
-    return (
-        series.str.strip()
-        .str.upper()
-        .str.normalize("NFKD")
-        .str.encode("ascii", errors="ignore")
-        .str.decode("utf-8")
-        .str.replace("'", "")
-    )
-
+URL = "https://www.gov.br/anac/pt-br/acesso-a-informacao/dados-abertos/areas-de-atuacao/aeronaves-1/registro-aeronautico-brasileiro/aeronaves-registradas-no-registro-aeronautico-brasileiro-csv"
 
-def extract_file():
-    url = "https://www.gov.br/anac/pt-br/acesso-a-informacao/dados-abertos/areas-de-atuacao/aeronaves-1/registro-aeronautico-brasileiro/aeronaves-registradas-no-registro-aeronautico-brasileiro-csv"
-
-    response = requests.get(url, verify=False)
 
+def extract_file(artifact: Artifact):
     df = pd.read_csv(
-        io.StringIO(response.content.decode("iso-8859-1")),
+        artifact.open(),
+        encoding="iso-8859-1",
         sep=";",
         dtype=str,
         skiprows=1,
     )
 
-    # replace every character that is not a number or letter
-    df["CPF_CNPJ"] = (df["CPF_CNPJ"]
-                      .str.replace(".", "")
-                      .str.replace("-", "")
-                      .str.replace("/", "")
-    )
-    df["CPF_CGC"] = (df["CPF_CGC"]
-                     .str.replace(".", "")
-                     .str.replace("-", "")
-                     .str.replace("/", "")
-    )
-    df["PROPRIETARIO"] = normalize_str_series(df["PROPRIETARIO"])
-    df["NM_OPERADOR"] = normalize_str_series(df["NM_OPERADOR"])
+    # drop the document punctuation, keeping any other character as published
+    df["CPF_CNPJ"] = strip_chars(df["CPF_CNPJ"], ".-/")
+    df["CPF_CGC"] = strip_chars(df["CPF_CGC"], ".-/")
+    df["PROPRIETARIO"] = normalize_str_series(df["PROPRIETARIO"], remove="'")
+    df["NM_OPERADOR"] = normalize_str_series(df["NM_OPERADOR"], remove="'")
 
     return df
 
 
 def run():
 
-    connection = dict(
-        database="anac", host="data-warehouse", user="admin", password="admin"
-    )
+    cache = ArtifactCache()
+    artifact = cache.fetch(URL, verify=False)
 
-    client = Client(**connection)
+    if not artifact.changed:
+        print("RAB file unchanged since the last run")
+        return
 
-    df = extract_file()
+    df = extract_file(artifact)
 
-    client.insert_dataframe(
-        'INSERT INTO "rab" VALUES',
-        df,
-        settings=dict(use_numpy=True),
-    )
+    ClickHouseSink("anac", "rab").replace(df)
+
+    cache.commit(artifact)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@ import os
 import pandas as pd
 import datetime
 
+from br_parsers import parse_date
+from documents import only_digits
+
 df = []
 for fname in os.listdir('.'):
     if fname.endswith('.csv'):
@@ -9,13 +12,13 @@ for fname in os.listdir('.'):
         df.append(tmp)
 
 df = pd.concat(df)
-df['documento'] = df['CPF/CNPJ'].apply(lambda x: ''.join([c for c in x if c.isnumeric()]) if not pd.isna(x) else x)
+df['documento'] = only_digits(df['CPF/CNPJ'])
 df = df.rename(columns={'UF': 'uf',
                         'Município': 'municipio',
                         'Nome': 'nome',
                         'Processo': 'processo',
                         'Trânsito em julgado': 'data_transito_julgado'})
 df = df.drop(['Ficha', 'CPF/CNPJ', 'Deliberações'], axis=1)
-df['data_transito_julgado'] = pd.to_datetime(df['data_transito_julgado'], format='%d/%m/%Y')
+df['data_transito_julgado'] = parse_date(df['data_transito_julgado'])
 df['data_observacao'] = datetime.date.today()
 df.to_csv('contas_irregulares.csv', sep='|')
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The shared modules live at the root of etls, next to this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
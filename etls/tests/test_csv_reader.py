@@ -0,0 +1,47 @@
+"""csv_reader tests."""
+import io
+
+import pandas as pd
+
+import csv_reader
+
+
+def multiline_csv(rows):
+    lines = ["ID;DESCRICAO"] + [f'{i};"linha {i}\nsegue na linha seguinte"' for i in range(rows)]
+    return "\n".join(lines).encode(csv_reader.ENCODING)
+
+
+def test_quoted_newlines_across_blocks():
+    data = multiline_csv(20_000)
+    # Small blocks, so many quoted fields fall across a block boundary
+    df = csv_reader.read_csv(io.BytesIO(data), block_size=4096)
+    expected = pd.read_csv(io.BytesIO(data), sep=";", encoding=csv_reader.ENCODING, dtype=str)
+
+    assert len(df) == 20_000
+    assert df["DESCRICAO"].astype(object).tolist() == expected["DESCRICAO"].tolist()
+
+
+def test_iter_csv_quoted_newlines_across_blocks():
+    chunks = list(csv_reader.iter_csv(io.BytesIO(multiline_csv(20_000)), chunksize=5_000, block_size=4096))
+
+    assert sum(len(chunk) for chunk in chunks) == 20_000
+    assert chunks[-1]["DESCRICAO"].iloc[-1] == "linha 19999\nsegue na linha seguinte"
+
+
+def test_path_sources_are_closed(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    path.write_bytes(multiline_csv(100))
+    opened = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        f = real_open(*args, **kwargs)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    assert len(csv_reader.read_csv(path)) == 100
+    assert sum(len(chunk) for chunk in csv_reader.iter_csv(str(path), chunksize=10)) == 100
+
+    assert len(opened) == 2
+    assert all(f.closed for f in opened)
@@ -0,0 +1,40 @@
+"""documents tests."""
+import numpy as np
+import pandas as pd
+
+import documents
+
+
+def test_clean_cnpj_pads_and_validates():
+    cleaned, valid = documents.clean_cnpj(pd.Series(["11.222.333/0001-81", "1.234", None]))
+
+    assert cleaned.tolist()[:2] == ["11222333000181", "00000000001234"]
+    assert pd.isna(cleaned.iloc[2])
+    assert valid.tolist() == [True, False, False]
+
+
+def test_overlong_values_are_not_truncated():
+    cleaned, valid = documents.clean_cnpj(pd.Series(["123.456.789/0123-45", "12345678901234"]))
+    assert cleaned.iloc[0] == "123456789012345"
+    assert not valid[0]
+
+    cleaned, valid = documents.clean_cpf(pd.Series(["529.982.247-2599"]))
+    assert cleaned.iloc[0] == "5299822472599"
+    assert not valid[0]
+
+
+def test_values_without_digits_are_null():
+    cleaned, valid = documents.clean_cpf(pd.Series(["", "...", "529.982.247-25"]))
+
+    assert cleaned.isna().tolist() == [True, True, False]
+    assert valid.tolist() == [False, False, True]
+
+
+def test_strip_chars_matches_str_replace():
+    rng = np.random.default_rng(0)
+    alphabet = np.array(list("0123456789abcXYZ.-/ *ÁÇ"))
+    values = ["".join(rng.choice(alphabet, rng.integers(0, 20))) for _ in range(5_000)] + [None]
+    series = pd.Series(values, dtype=object)
+
+    expected = series.str.replace(".", "").str.replace("-", "").str.replace("/", "")
+    assert documents.strip_chars(series, ".-/").equals(expected)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+KEY_COLS = ['ano', 'partido', 'cargo']
+
+
+class CandidateIndex:
+    """Tabela de candidatos indexada para buscar se um candidato foi eleito.
+
+    Guarda os resultados de ETLCandidatura em memoria. As chaves (cpf, ano, partido, cargo) e
+    (nome, ano, partido, cargo) sao codificadas como categorias e combinadas em um unico inteiro, e as
+    buscas sao feitas por hash com get_indexer, sem merge e sem reler o CSV de candidaturas.
+    """
+
+    def __init__(self, candidates):
+        candidates = candidates.filter(items=['cpf', 'nome', 'eleito'] + KEY_COLS)
+        # Posicao -1 (nao encontrado) pega o NaN do final
+        self.eleito = np.append(candidates['eleito'].to_numpy(dtype=object), np.nan)
+        self.by_cpf = self._index(candidates, 'cpf', candidates['cpf'].notna().to_numpy())
+        self.by_name = self._index(candidates, 'nome', np.ones(len(candidates), dtype=bool))
+
+    @classmethod
+    def from_csv(cls, path):
+        candidates = pd.read_csv(path, dtype={'cpf': str}, usecols=['cpf', 'ano', 'partido', 'cargo', 'eleito', 'nome'])
+        candidates['cpf'] = candidates['cpf'].str.zfill(11)
+        return cls(candidates)
+
+    @staticmethod
+    def _index(candidates, first_col, rows):
+        cols = [first_col] + KEY_COLS
+        categories = [pd.Categorical(candidates[col].to_numpy()[rows]).categories for col in cols]
+        keys, _ = CandidateIndex._keys(categories, [candidates[col].to_numpy()[rows] for col in cols])
+        return categories, pd.Index(keys), np.flatnonzero(rows)
+
+    @staticmethod
+    def _keys(categories, values):
+        """Codigos das categorias de cada coluna combinados em um unico int64, com nulos no codigo 0 como
+        no merge (NaN casa com NaN). Tambem retorna as linhas com algum valor fora das categorias."""
+        keys = np.zeros(len(values[0]), dtype=np.int64)
+        unknown = np.zeros(len(values[0]), dtype=bool)
+        for cats, column in zip(categories, values):
+            codes = pd.Categorical(column, categories=cats).codes.astype(np.int64)
+            missing = np.flatnonzero(codes < 0)
+            unknown[missing] |= pd.notna(column[missing])
+            keys = keys * (len(cats) + 1) + codes + 1
+        return keys, unknown
+
+    @staticmethod
+    def _lookup(index, df, first_col):
+        categories, keys, positions = index
+        # Mesma garantia do validate='many_to_one' dos merges: cada linha acha no maximo um candidato
+        if not keys.is_unique:
+            raise pd.errors.MergeError(f"Candidate keys ({first_col}, {', '.join(KEY_COLS)}) are not unique")
+        values = [df[col].to_numpy() for col in [first_col] + KEY_COLS]
+        target, unknown = CandidateIndex._keys(categories, values)
+        found = keys.get_indexer(target)
+        return np.where((found >= 0) & ~unknown, positions[found], -1)
+
+    def elected_by_cpf(self, df, cpf_col='cpf_candidato'):
+        """Coluna eleito para cada linha de df, buscando pelo CPF do candidato"""
+        return self.eleito[self._lookup(self.by_cpf, df, cpf_col)]
+
+    def elected_by_name(self, df, name_col='nome_candidato'):
+        """Coluna eleito para cada linha de df, buscando pelo nome do candidato (para CPFs nulos)"""
+        return self.eleito[self._lookup(self.by_name, df, name_col)]
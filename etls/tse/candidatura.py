@@ -49,7 +49,7 @@ class ETLCandidatura:
                                               'CD_SIT_TOT_TURNO': 'eleito'})
 
         # Atribui eleito aos codigos 1, 2 ou 3
-        self.data['eleito'] = self.data['eleito'].apply(lambda x: True if x == 1 or x == 2 or x == 3 else False)
+        self.data['eleito'] = self.data['eleito'].isin([1, 2, 3])
 
         self.data = standard_adjustments(self.data, self.year, self.national_elections, ['nome', 'municipio'])
 
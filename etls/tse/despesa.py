@@ -3,12 +3,13 @@ import zipfile
 
 import pandas as pd
 
+from candidates import CandidateIndex
 from utils import load_zipped_input_files, convert_value_string_to_float, filled_and_null_cpf_tables, \
     verify_column_elected, standard_adjustments, compare_db_and_df_cols
 
 
 class ETLDespesa:
-    def __init__(self, year, raw_dir, processed_dir):
+    def __init__(self, year, raw_dir, processed_dir, candidates=None):
         print("Started despesa ", year)
         if year % 4 == 2:
             self.national_elections = True
@@ -16,9 +17,11 @@ class ETLDespesa:
             self.national_elections = False
         self.raw_path = os.path.join(raw_dir, f'prestacao_de_contas_eleitorais_candidatos_{year}.zip')
         self.processed_dir = processed_dir
-        self.processed_path = os.path.join(processed_dir, 'despesa_campanha.csv')
+        # Uma particao por ano, para que anos diferentes nao sobrescrevam o mesmo arquivo
+        self.processed_path = os.path.join(processed_dir, f'ano={year}', 'despesa_campanha.csv')
         self.data = pd.DataFrame()
         self.year = year
+        self.candidates = candidates
         self.db_cols = ['ano', 'uf', 'municipio', 'documento_fornecedor', 'cpf_candidato',
                         'numero_candidato', 'partido', 'cargo', 'valor_despesa', 'eleito']
 
@@ -71,21 +74,15 @@ class ETLDespesa:
                 .filter(items=self.db_cols)
         )
 
-        print("Reading candidates data...")
-        elected_data = pd.read_csv(os.path.join(self.processed_dir, f'{self.year}_candidatura.csv'),
-                                   dtype={'cpf': str},
-                                   usecols=['cpf', 'ano', 'partido', 'cargo', 'eleito', 'nome'])
-        print("Filling CPFs with 0 in candidates data...")
-        elected_data['cpf'] = elected_data['cpf'].str.zfill(11)
+        if self.candidates is None:
+            print("Reading candidates data...")
+            self.candidates = CandidateIndex.from_csv(os.path.join(self.processed_dir, f'{self.year}_candidatura.csv'))
 
-        # Funde com tabela de candidatos para obter eleitos
-        print("Merging tables... This can take a while")
+        # Busca na tabela de candidatos para obter eleitos
+        print("Looking up elected candidates...")
         self.data = (
             self.data
-                .merge(elected_data
-                       .drop(columns=['nome'])
-                       .rename(columns={'cpf': 'cpf_candidato'}),
-                       on=['cpf_candidato', 'ano', 'partido', 'cargo'], how='left')
+                .assign(eleito=self.candidates.elected_by_cpf(self.data))
                 .filter(items=self.db_cols)
         )
 
@@ -97,15 +94,11 @@ class ETLDespesa:
                     .agg({'uf': 'max', 'numero_candidato': 'max', 'valor_despesa': 'sum', 'cpf_candidato': 'max',
                           'municipio': 'max'})
                     .reset_index()
-                    .filter(items=self.db_cols)
             )
 
-            print("Merging more tables... This can take a while")
             temp_null_cpf = (
                 temp_null_cpf
-                    .merge(elected_data
-                           .drop(columns=['cpf']),
-                           on=['nome_candidato', 'ano', 'partido', 'cargo'], validate='many_to_one', how='left')
+                    .assign(eleito=self.candidates.elected_by_name(temp_null_cpf))
                     .filter(items=self.db_cols)
             )
 
@@ -115,4 +108,5 @@ class ETLDespesa:
         compare_db_and_df_cols(self.data, self.db_cols)
 
     def save_data(self):
+        os.makedirs(os.path.dirname(self.processed_path), exist_ok=True)
         self.data.to_csv(self.processed_path, index=False)
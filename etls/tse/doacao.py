@@ -4,12 +4,13 @@ import zipfile
 
 import pandas as pd
 
+from candidates import CandidateIndex
 from utils import load_zipped_input_files, standard_adjustments, convert_value_string_to_float, \
     filled_and_null_cpf_tables, verify_column_elected, compare_db_and_df_cols
 
 
 class ETLDoacao:
-    def __init__(self, year, raw_dir, processed_dir):
+    def __init__(self, year, raw_dir, processed_dir, candidates=None):
         print("Started doacao ", year)
         if year % 4 == 2:
             self.national_elections = True
@@ -17,11 +18,13 @@ class ETLDoacao:
             self.national_elections = False
         self.current_path = pathlib.Path(__file__).parent.absolute()
         self.raw_path = os.path.join(raw_dir, f'prestacao_de_contas_eleitorais_candidatos_{year}.zip')
-        self.processed_path = os.path.join(processed_dir, 'doacao_campanha.csv')
+        # Uma particao por ano, para que anos diferentes nao sobrescrevam o mesmo arquivo
+        self.processed_path = os.path.join(processed_dir, f'ano={year}', 'doacao_campanha.csv')
         self.processed_dir = processed_dir
         self.path = f'receitas_candidatos_{year}' + '_{}.csv'
         self.data = pd.DataFrame()
         self.year = year
+        self.candidates = candidates
         self.db_cols = ['ano', 'documento_doador', 'nome_doador',
                         'valor_doacao', 'cpf_candidato', 'nome_candidato',
                         'cargo', 'partido', 'municipio', 'uf', 'eleito']
@@ -49,9 +52,9 @@ class ETLDoacao:
         self.data = load_zipped_input_files(zf, f'prestacao_contas_candidatos_{self.year}' + '_{}.csv', self.states, cols)
 
     def transform_data(self):
-        self.data['NM_DOADOR'] = self.data.apply(lambda x: x['NM_DOADOR'] if pd.isna(x['NM_DOADOR_RFB']) or
-                                                                             x['NM_DOADOR_RFB'] == ''
-        else x['NM_DOADOR_RFB'], axis=1)
+        # Usa o nome do doador na Receita Federal quando ele existe
+        has_rfb_name = self.data['NM_DOADOR_RFB'].notna() & (self.data['NM_DOADOR_RFB'] != '')
+        self.data['NM_DOADOR'] = self.data['NM_DOADOR_RFB'].where(has_rfb_name, self.data['NM_DOADOR'])
 
         self.data = self.data.rename(columns={'ANO_ELEICAO': 'ano',
                                               'NR_CPF_CNPJ_DOADOR': 'documento_doador',
@@ -77,19 +80,15 @@ class ETLDoacao:
 
         self.data, temp_null_cpf = filled_and_null_cpf_tables(self.data, cpf_col='cpf_candidato')
 
-        elected_data = pd.read_csv(os.path.join(self.processed_dir, f'{self.year}_candidatura.csv'),
-                                   dtype={'cpf': str},
-                                   usecols=['cpf', 'ano', 'partido', 'cargo', 'eleito', 'nome'])
-        elected_data['cpf'] = elected_data['cpf'].str.zfill(11)
+        if self.candidates is None:
+            self.candidates = CandidateIndex.from_csv(os.path.join(self.processed_dir, f'{self.year}_candidatura.csv'))
 
         # A planilha de doacao nao eh agrupada. Despesa eh agrupada pelo tamanho da tabela ser muito grande
 
-        # Funde com tabela de candidatos para obter eleitos
+        # Busca na tabela de candidatos para obter eleitos
         self.data = (
             self.data
-                .merge(elected_data
-                       .rename(columns={'cpf': 'cpf_candidato'}),
-                       on=['cpf_candidato', 'ano', 'partido', 'cargo'], validate='many_to_one', how='left')
+                .assign(eleito=self.candidates.elected_by_cpf(self.data))
                 .filter(items=self.db_cols)
         )
 
@@ -97,10 +96,7 @@ class ETLDoacao:
             # Lida com CPF nulo (portanto usa nome como substituto)
             temp_null_cpf = (
                 temp_null_cpf
-                    .merge(elected_data
-                           .drop(columns=['cpf'])
-                           .rename(columns={'nome': 'nome_candidato'}),
-                           on=['nome_candidato', 'ano', 'partido', 'cargo'], validate='many_to_one', how='left')
+                    .assign(eleito=self.candidates.elected_by_name(temp_null_cpf))
                     .filter(items=self.db_cols)
             )
 
@@ -111,4 +107,5 @@ class ETLDoacao:
         compare_db_and_df_cols(self.data, self.db_cols)
 
     def save_data(self):
+        os.makedirs(os.path.dirname(self.processed_path), exist_ok=True)
         self.data.to_csv(self.processed_path, index=False)
@@ -0,0 +1,208 @@
+"""
+Vectorized cleaning and validation of CPF and CNPJ numbers.
+
+A column is handed to Arrow once, and its value offsets and UTF-8 data buffer are
+read as NumPy arrays, so no Python object is touched per document. Punctuation is
+dropped with a byte lookup table and the digits are zero padded by Arrow, which
+leaves every document exactly as wide as its type. The data buffer is then viewed
+as a (documents x digits) matrix and checked against the two check digits with
+weighted sums. Values with more digits than the document are never truncated.
+
+`string[pyarrow]` columns, as returned by csv_reader, are read and returned
+without copying their text into Python strings; other columns come back as
+object columns.
+"""
+from typing import Callable, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ZERO = ord("0")
+
+CPF_LENGTH = 11
+CNPJ_LENGTH = 14
+
+# Float weights, so the weighted sums run as BLAS products; they stay exact
+CPF_WEIGHTS_1 = np.arange(10, 1, -1, dtype=np.float32)
+CPF_WEIGHTS_2 = np.arange(11, 1, -1, dtype=np.float32)
+CNPJ_WEIGHTS_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.float32)
+CNPJ_WEIGHTS_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], dtype=np.float32)
+
+
+def _is_arrow_string(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == "pyarrow"
+
+
+def _to_arrow(series: pd.Series) -> pa.LargeStringArray:
+    try:
+        array = pa.array(series, type=pa.large_string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Numbers and other non-text values, e.g. from read_csv without dtype=str
+        array = pa.array(series.where(series.isna(), series.astype(str)), type=pa.large_string(), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    return array
+
+
+def _buffers(array: pa.LargeStringArray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the UTF-8 bytes of a text array, the offsets of each value in them
+    (n + 1 of them, starting at 0) and the null mask.
+    """
+    n = len(array)
+    nulls = array.is_null().to_numpy(zero_copy_only=False)
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[array.offset : array.offset + n + 1]
+    if data_buffer is None:
+        data = np.zeros(0, dtype=np.uint8)
+    else:
+        data = np.frombuffer(data_buffer, dtype=np.uint8)[offsets[0] : offsets[-1]]
+    return data, offsets - offsets[0], nulls
+
+
+def _byte_mask(data: np.ndarray, chars: str) -> np.ndarray:
+    """
+    Mask of the bytes of `data` equal to one of the ASCII characters in `chars`.
+    """
+    encoded = chars.encode()
+    if len(encoded) != len(chars):
+        # Multi-byte characters cannot be matched one byte at a time
+        raise ValueError(f"Only ASCII characters are supported, got {chars!r}")
+    if len(encoded) > 8:
+        table = np.zeros(256, dtype=bool)
+        table[np.frombuffer(encoded, dtype=np.uint8)] = True
+        return table[data]
+    mask = np.zeros(len(data), dtype=bool)
+    for byte in encoded:
+        mask |= data == byte
+    return mask
+
+
+def _digit_mask(data: np.ndarray) -> np.ndarray:
+    return (data - np.uint8(ZERO)) < 10
+
+
+def _from_buffers(data: np.ndarray, offsets: np.ndarray, nulls: np.ndarray) -> pa.LargeStringArray:
+    validity = pa.py_buffer(np.packbits(~nulls, bitorder="little")) if nulls.any() else None
+    return pa.LargeStringArray.from_buffers(len(nulls), pa.py_buffer(offsets), pa.py_buffer(data), validity)
+
+
+def _to_series(array: pa.LargeStringArray, series: pd.Series) -> pd.Series:
+    if _is_arrow_string(series):
+        return pd.Series(array.cast(pa.string()), index=series.index, name=series.name, dtype=series.dtype)
+    text = array.to_numpy(zero_copy_only=False)
+    text[array.is_null().to_numpy(zero_copy_only=False)] = np.nan
+    return pd.Series(text, index=series.index, name=series.name)
+
+
+def _filter(array: pa.LargeStringArray, keep_bytes: Callable[[np.ndarray], np.ndarray]) -> pa.LargeStringArray:
+    """
+    Keeps the bytes of each value selected by `keep_bytes`, in their original
+    order. Nulls stay null.
+    """
+    data, offsets, nulls = _buffers(array)
+    keep = keep_bytes(data)
+
+    n = len(nulls)
+    width = offsets[1] if n else 0
+    if width and (np.diff(offsets) == width).all():
+        # Uniformly formatted values, e.g. every CPF as 000.000.000-00: when the
+        # same positions are kept in every value the kept columns are sliced out
+        matrix = keep.reshape(n, width)
+        if (matrix == matrix[0]).all():
+            columns = np.flatnonzero(matrix[0])
+            kept = data.reshape(n, width)[:, columns].ravel()
+            return _from_buffers(kept, np.arange(n + 1, dtype=np.int64) * len(columns), nulls)
+
+    counts = np.concatenate([[0], np.cumsum(keep, dtype=np.int64)])
+    return _from_buffers(data[keep], counts[offsets], nulls)
+
+
+def only_digits(series: pd.Series, extra: str = "") -> pd.Series:
+    """
+    Keeps the digits of each value, and any ASCII character in `extra` (e.g. "*"
+    for masked CPFs), in their original order. Nulls stay null.
+    """
+    return _to_series(_filter(_to_arrow(series), lambda data: _digit_mask(data) | _byte_mask(data, extra)), series)
+
+
+def strip_chars(series: pd.Series, chars: str) -> pd.Series:
+    """
+    Removes every ASCII character in `chars` from each value, keeping the others
+    in their original order, as a chain of str.replace calls would. Nulls stay
+    null.
+    """
+    return _to_series(_filter(_to_arrow(series), lambda data: ~_byte_mask(data, chars)), series)
+
+
+def _digit_matrix(digits: pa.LargeStringArray, count: np.ndarray, length: int) -> np.ndarray:
+    """
+    The (documents x `length`) uint8 matrix of the digits of each value, zero
+    padded on the left as with str.zfill. Values longer than `length`, and nulls,
+    become rows of zeros.
+    """
+    if (count == length).all():
+        data, _, _ = _buffers(digits)
+        return (data - np.uint8(ZERO)).reshape(len(digits), length)
+    fits = pa.array(pc.fill_null(pc.less_equal(pc.binary_length(digits), length), False))
+    padded = pc.if_else(fits, pc.utf8_lpad(digits, length, "0"), pa.scalar("0" * length, pa.large_string()))
+    data, _, _ = _buffers(padded)
+    return (data - np.uint8(ZERO)).reshape(len(digits), length)
+
+
+def _check_digit(total: np.ndarray, cpf: bool) -> np.ndarray:
+    total = total.astype(np.int32)
+    if cpf:
+        return (total * 10 % 11) % 10
+    remainder = total % 11
+    return np.where(remainder < 2, 0, 11 - remainder)
+
+
+def _validity(digits: np.ndarray, nulls: np.ndarray, too_long: np.ndarray, cpf: bool) -> np.ndarray:
+    weights_1, weights_2 = (CPF_WEIGHTS_1, CPF_WEIGHTS_2) if cpf else (CNPJ_WEIGHTS_1, CNPJ_WEIGHTS_2)
+    n = len(weights_1)
+    # Both weighted sums in one product: the first check digit is not weighted in the first sum
+    weights = np.stack([np.append(weights_1, 0), weights_2], axis=1)
+    totals = digits[:, : n + 1].astype(np.float32) @ weights
+    first = _check_digit(totals[:, 0], cpf)
+    second = _check_digit(totals[:, 1], cpf)
+    # Repeated digits (000.000.000-00, 111...) pass the check digits but are not issued
+    repeated = (digits == digits[:, :1]).all(axis=1)
+    return (digits[:, n] == first) & (digits[:, n + 1] == second) & ~repeated & ~nulls & ~too_long
+
+
+def _clean(series: pd.Series, length: int, cpf: bool) -> Tuple[pd.Series, np.ndarray]:
+    digits = _filter(_to_arrow(series), _digit_mask)
+    _, offsets, nulls = _buffers(digits)
+    # Null values have no bytes
+    count = np.diff(offsets)
+    too_long = count > length
+    # A value without digits would otherwise become a row of zeros
+    missing = count == 0
+    valid = _validity(_digit_matrix(digits, count, length), missing, too_long, cpf)
+
+    # utf8_lpad never truncates, so the extra digits of a value that is not a
+    # document of this kind are all kept
+    padded = pc.utf8_lpad(digits, length, "0")
+    cleaned = pc.if_else(pa.array(missing), pa.scalar(None, pa.large_string()), padded)
+    return _to_series(cleaned, series), valid
+
+
+def clean_cpf(series: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Returns the 11 zero-padded digits of each CPF and a mask of the valid ones.
+    Nulls and values without digits are null, and values with more than 11
+    digits keep all of them; neither is valid.
+    """
+    return _clean(series, CPF_LENGTH, cpf=True)
+
+
+def clean_cnpj(series: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Returns the 14 zero-padded digits of each CNPJ and a mask of the valid ones.
+    Nulls and values without digits are null, and values with more than 14
+    digits keep all of them; neither is valid.
+    """
+    return _clean(series, CNPJ_LENGTH, cpf=False)
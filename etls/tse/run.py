@@ -1,18 +1,185 @@
-from tqdm import tqdm
+"""Executa os ETLs do TSE para um intervalo de anos eleitorais.
 
+Cada ano roda em um processo proprio, encadeando candidatura -> despesa -> doacao com a tabela de
+candidatos em memoria. Varios anos rodam ao mesmo tempo enquanto a soma dos picos de memoria estimados
+couber no orcamento de RAM. O pico de cada etapa e a memoria residente somada do processo do ano e dos
+leitores que rodam junto com ele, amostrada durante a etapa. Os picos da ultima execucao de cada tipo
+de eleicao (nacional ou municipal) ficam em data/stage_peaks.json e estimam as execucoes seguintes.
+
+    python run.py --start-year 2018 --end-year 2022 --memory-budget-gb 32 --workers 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import psutil
+
+from candidates import CandidateIndex
 from candidatura import ETLCandidatura
 from despesa import ETLDespesa
 from doacao import ETLDoacao
 
-raw_dir = 'data/raw'
-processed_dir = 'data/processed'
-year = 2022
-objs = [ETLCandidatura(year, raw_dir, processed_dir),
-        ETLDespesa(year, raw_dir, processed_dir),
-        ETLDoacao(year, raw_dir, processed_dir)
-        ]
-
-for etl in tqdm(objs, leave=False, desc='executing modules'):
-    etl.read_data()
-    etl.transform_data()
-    etl.save_data()
+RAW_DIR = os.path.join('data', 'raw')
+PROCESSED_DIR = os.path.join('data', 'processed')
+STAGE_PEAKS_PATH = os.path.join('data', 'stage_peaks.json')
+# Segundos entre amostras de memoria
+SAMPLE_INTERVAL = 0.2
+
+
+def election_kind(year):
+    return 'national' if year % 4 == 2 else 'municipal'
+
+
+class MemorySampler:
+    """Amostra, em uma thread, a memoria residente somada deste processo e de todos os seus filhos, que
+    rodam ao mesmo tempo (os leitores de load_zipped_input_files), e guarda o pico desde a ultima leitura"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self):
+        total = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                # Filho que terminou entre a listagem e a leitura
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def take_peak_mb(self):
+        """Pico em MB desde a ultima chamada, que recomeca a contagem"""
+        peak, self.peak = max(self.peak, self._rss()), 0
+        return peak / (1024 * 1024)
+
+
+def run_year(year, raw_dir, processed_dir):
+    """Roda as tres etapas de um ano e retorna o pico de memoria de cada uma, em MB"""
+    peaks = {}
+    sampler = MemorySampler()
+    sampler.start()
+    try:
+        candidatura = ETLCandidatura(year, raw_dir, processed_dir)
+        candidatura.read_data()
+        candidatura.transform_data()
+        candidatura.save_data()
+        candidates = CandidateIndex(candidatura.data)
+        del candidatura
+        peaks['candidatura'] = sampler.take_peak_mb()
+
+        for name, etl_class in [('despesa', ETLDespesa), ('doacao', ETLDoacao)]:
+            etl = etl_class(year, raw_dir, processed_dir, candidates=candidates)
+            etl.read_data()
+            etl.transform_data()
+            etl.save_data()
+            del etl
+            peaks[name] = sampler.take_peak_mb()
+    finally:
+        sampler.stop()
+    return peaks
+
+
+def load_stage_peaks(path=STAGE_PEAKS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_stage_peaks(stage_peaks, path=STAGE_PEAKS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(stage_peaks, f, indent=2, sort_keys=True)
+
+
+def estimated_peak_mb(year, stage_peaks, memory_budget_mb):
+    # Sem medicao para o tipo de eleicao, o ano e estimado como o orcamento inteiro e roda sozinho
+    peaks = stage_peaks.get(election_kind(year))
+    return max(peaks.values()) if peaks else memory_budget_mb
+
+
+def run(years, raw_dir, processed_dir, memory_budget_mb, workers):
+    stage_peaks = load_stage_peaks()
+    # Os anos mais pesados comecam primeiro, e os leves preenchem o orcamento que sobra
+    pending = sorted(years, key=lambda year: estimated_peak_mb(year, stage_peaks, memory_budget_mb), reverse=True)
+    running = {}
+    failed = []
+    # Um executor por ano: cada ano roda em um processo novo, que devolve toda a sua memoria ao terminar
+    context = multiprocessing.get_context('spawn')
+
+    while pending or running:
+        reserved = sum(estimate for _, estimate, _ in running.values())
+        for year in list(pending):
+            estimate = estimated_peak_mb(year, stage_peaks, memory_budget_mb)
+            if len(running) >= workers:
+                break
+            # Um ano maior que o orcamento ainda roda, mas sozinho
+            if running and reserved + estimate > memory_budget_mb:
+                continue
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+            future = executor.submit(run_year, year, raw_dir, processed_dir)
+            running[future] = (year, estimate, executor)
+            reserved += estimate
+            pending.remove(year)
+            print(f"Started {year} (estimated peak {estimate:.0f} MB, {reserved:.0f}/{memory_budget_mb:.0f} MB reserved)")
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            year, _, executor = running.pop(future)
+            executor.shutdown()
+            try:
+                peaks = future.result()
+            except Exception as e:
+                print(f"Failed {year}: {e!r}")
+                failed.append(year)
+                continue
+            print(f"Finished {year}, stage peaks (MB): {peaks}")
+            # A ultima medicao substitui a anterior, para a estimativa acompanhar o tamanho atual dos dados
+            stage_peaks[election_kind(year)] = peaks
+            save_stage_peaks(stage_peaks)
+
+    if failed:
+        raise RuntimeError(f"TSE ETL failed for years {sorted(failed)}")
+
+
+def total_memory_mb():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start-year', type=int, default=2022)
+    parser.add_argument('--end-year', type=int, help='ultimo ano, inclusive (padrao: start-year)')
+    parser.add_argument('--raw-dir', default=RAW_DIR)
+    parser.add_argument('--processed-dir', default=PROCESSED_DIR)
+    parser.add_argument('--memory-budget-gb', type=float, help='padrao: 80%% da memoria da maquina')
+    parser.add_argument('--workers', type=int, default=2, help='anos rodando ao mesmo tempo, no maximo')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    # Protegido porque os anos e load_zipped_input_files rodam em processos que importam este modulo
+    args = parse_args()
+    end_year = args.end_year if args.end_year is not None else args.start_year
+    # Eleicoes ocorrem a cada dois anos, alternando nacionais e municipais
+    years = list(range(args.start_year, end_year + 1, 2))
+    memory_budget_mb = args.memory_budget_gb * 1024 if args.memory_budget_gb else 0.8 * total_memory_mb()
+    run(years, args.raw_dir, args.processed_dir, memory_budget_mb, args.workers)
@@ -1,18 +1,70 @@
+import hashlib
 import os
 import pathlib
 import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from br_parsers import date_to_int, parse_decimal
+from documents import only_digits
+from text_normalization import normalize_str_series
 
-def load_zipped_input_files(zip_file, file_name_format, states, cols):
-    data = pd.DataFrame()
-    read_type = {'NR_CPF_CNPJ_DOADOR': str, 'NR_CPF_CANDIDATO': str, 'NR_CPF_CNPJ_FORNECEDOR': str}
-    for uf in tqdm(states, leave=False, desc='reading_data'):
-        new_data = pd.read_csv(zip_file.open(os.path.join(file_name_format.format(uf))),
-                               sep=';', encoding='latin1', usecols=cols, dtype=read_type)  # , nrows=5)
-        data = pd.concat([data, new_data], sort=False, ignore_index=True)
+
+# Parsed input files are cached here as Parquet, next to data/raw and data/processed
+CACHE_DIR = os.path.join('data', 'cache')
+READ_TYPE = {'NR_CPF_CNPJ_DOADOR': str, 'NR_CPF_CANDIDATO': str, 'NR_CPF_CNPJ_FORNECEDOR': str}
+
+
+def read_zipped_member(zip_path, member, cols):
+    # Runs in a worker process, so it reopens the zip instead of sharing the parent's handle
+    with zipfile.ZipFile(zip_path) as zip_file:
+        return pd.read_csv(zip_file.open(member), sep=';', encoding='latin1', usecols=cols, dtype=READ_TYPE)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_cache_path(zip_file, file_name_format, states, cols, cache_dir):
+    key = hashlib.sha256(
+        '\0'.join([file_hash(zip_file.filename), file_name_format, ','.join(states), ','.join(cols)]).encode()
+    ).hexdigest()
+    return os.path.join(cache_dir, f'{key}.parquet')
+
+
+def load_zipped_input_files(zip_file, file_name_format, states, cols, cache_dir=CACHE_DIR, max_workers=None):
+    """Le os arquivos de cada UF dentro do zip do TSE e os concatena em um unico data frame.
+
+    Os arquivos sao lidos em paralelo, um processo por UF, e o resultado fica em cache como Parquet,
+    indexado pelo hash do zip e pelas colunas lidas. Com cache_dir=None o cache nao e usado.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = input_cache_path(zip_file, file_name_format, states, cols, cache_dir)
+        if os.path.exists(cache_path):
+            print(f"Reading cached input files from {cache_path}")
+            return pd.read_parquet(cache_path)
+
+    members = [file_name_format.format(uf) for uf in states]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(tqdm(executor.map(read_zipped_member, repeat(zip_file.filename), members, repeat(cols)),
+                           total=len(members), leave=False, desc='reading_data'))
+    data = pd.concat(frames, sort=False, ignore_index=True)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written aside and renamed, so an interrupted run never leaves a partial cache
+        data.to_parquet(cache_path + '.tmp', index=False)
+        os.replace(cache_path + '.tmp', cache_path)
     return data
 
 
@@ -22,17 +74,25 @@ def basic_assertions(df, year):
     assert (df[df['ano'] == year].shape[0] == df.shape[0])
 
 
+def map_distinct(series, function):
+    """Aplica function (sobre um Index) apenas aos valores distintos de uma coluna com poucos valores, como cargo"""
+    codes, uniques = pd.factorize(series)
+    # Codigo -1 (nulo) pega o NaN do final
+    mapped = np.append(np.asarray(function(uniques), dtype=object), np.nan)
+    return pd.Series(mapped[codes], index=series.index, name=series.name)
+
+
 def party_name_conversion(df):
     print("Converting party names...")
     conversion_dict = {'PATRIOTA': 'PATRI'}
-    df['partido'] = df['partido'].apply(lambda x: conversion_dict[x] if x in list(conversion_dict) else x)
+    df['partido'] = map_distinct(df['partido'], lambda values: values.to_series().replace(conversion_dict))
     return df
 
 
 def adjust_cpf(df, cpf_col='cpf'):
     # Codigo -4 (encontrado no formato '000000000-4') eh usado para informacao nao divulgavel. Deve ser NULL
     df[cpf_col] = df[cpf_col].str.zfill(11)
-    df[cpf_col] = df[cpf_col].apply(lambda x: None if x == '000000000-4' else x)
+    df[cpf_col] = df[cpf_col].mask(df[cpf_col] == '000000000-4')
     print("NULL CPFs: ", df[df[cpf_col].isna()].shape[0])
     return df
 
@@ -64,20 +124,12 @@ def compare_db_and_df_cols(df, db_cols, check_order=True):
                 raise AssertionError
 
 
-def dob_to_int(dob):
-    if type(dob) == str:
-        split_dob = dob.split('/')
-        return int(split_dob[2] + split_dob[1] + split_dob[0])
-    else:
-        return None
-
-
 def dob_conversion(df):
     """Converte a data de nascimento no formato DD/MM/AAAA para AAAAMMDD
     """
     print('Converting date of birth...')
 
-    df['data_nascimento'] = df['data_nascimento'].apply(dob_to_int)
+    df['data_nascimento'] = date_to_int(df['data_nascimento'])
     return df
 
 
@@ -118,9 +170,8 @@ def standard_adjustments(df, year, national_elections, name_adjust_cols, cpf_col
         pass
     for col in name_adjust_cols:
         print(f"Adjusting string names from column {col}...")
-        df[col] = (df[col].str.upper().str.strip().
-                   str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('utf-8'))
-    df['cargo'] = df['cargo'].apply(lambda x: x.upper())
+        df[col] = normalize_str_series(df[col])
+    df['cargo'] = map_distinct(df['cargo'], lambda values: values.str.upper())
     if national_elections:
         df['municipio'] = ''
     df = adjust_cpf(df, cpf_col=cpf_col)
@@ -135,19 +186,19 @@ def filled_and_null_cpf_tables(df, cpf_col='cpf'):
 
 
 def convert_value_string_to_float(df, col):
-    df[col] = df[col].apply(lambda x: float(x.replace(',', '.')))
+    df[col] = parse_decimal(df[col])
     return df
 
 
 def truncate_string_cols(df, col_list, size):
     for col in col_list:
-        df[col] = df[col].apply(lambda x: x.strip() if not pd.isna(x) else x)
-        df[col] = df[col].apply(lambda x: x[0:size - 2] + '..'
-        if not pd.isna(x) and type(x) == str and len(x) > size else x)
+        column = df[col].str.strip()
+        too_long = column.str.len() > size
+        column[too_long] = column[too_long].str[0:size - 2] + '..'
+        df[col] = column
     return df
 
 
 def wide_adjust_cpf(df, cpf_col):
-    df[cpf_col] = df[cpf_col].apply(lambda x: x.replace('.', '').replace('/', '').replace('-', '').strip() if
-    type(x) == str else x)
+    df[cpf_col] = only_digits(df[cpf_col])
     return df
@@ -0,0 +1,177 @@
+"""
+Raw-artifact cache for full-snapshot downloads, kept in the data lake.
+
+For every source the last downloaded file is stored next to a small JSON document
+with its ETag, Last-Modified and SHA-256. `fetch` sends a conditional GET built
+from those validators; when the publisher answers 304, or sends back a body with
+the same hash, the artifact is reported as unchanged so the ETL can skip parsing
+and loading altogether. `commit` is called only after a successful load, so a
+failed run is retried in full the next time.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Optional
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+
+import http_client
+
+# The data lake is the `data-lake` MinIO service from docker-compose. When no
+# endpoint is configured the default S3 endpoint and credentials are used.
+DATA_LAKE_ENDPOINT = os.environ.get("DATA_LAKE_ENDPOINT")
+DATA_LAKE_BUCKET = os.environ.get("DATA_LAKE_BUCKET", "linker-etl")
+CACHE_PREFIX = "cache/raw"
+
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
+
+def data_lake_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=DATA_LAKE_ENDPOINT,
+        aws_access_key_id=os.environ.get("DATA_LAKE_USER"),
+        aws_secret_access_key=os.environ.get("DATA_LAKE_PASSWORD"),
+    )
+
+
+class Artifact:
+    def __init__(self, key: str, url: str, metadata: dict, changed: bool, file=None) -> None:
+        self.key = key
+        self.url = url
+        self.metadata = metadata
+        self.changed = changed
+        self.file = file
+
+    @property
+    def content(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def open(self):
+        """
+        Returns the downloaded body as a binary file positioned at the start.
+        """
+        self.file.seek(0)
+        return self.file
+
+    @property
+    def path(self) -> str:
+        """
+        Path of the spooled body, so a worker process can open it instead of
+        receiving the bytes. Valid until the artifact is closed.
+        """
+        self.file.flush()
+        return self.file.name
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class ArtifactCache:
+    def __init__(self, bucket: str = DATA_LAKE_BUCKET, prefix: str = CACHE_PREFIX) -> None:
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = data_lake_client()
+
+    def _object_path(self, key: str, name: str) -> str:
+        return f"{self.prefix}/{hashlib.sha256(key.encode()).hexdigest()}/{name}"
+
+    def read_metadata(self, key: str) -> dict:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self._object_path(key, "metadata.json"))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "NoSuchBucket", "404"):
+                return {}
+            raise
+        return json.loads(response["Body"].read())
+
+    def _put(self, object_path: str, body) -> None:
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=object_path, Body=body)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchBucket":
+                raise
+            # A fresh MinIO volume starts without buckets
+            self.s3.create_bucket(Bucket=self.bucket)
+            if hasattr(body, "seek"):
+                body.seek(0)
+            self.s3.put_object(Bucket=self.bucket, Key=object_path, Body=body)
+
+    def _write_metadata(self, key: str, metadata: dict) -> None:
+        self._put(self._object_path(key, "metadata.json"), json.dumps(metadata).encode())
+
+    def fetch(self, url: str, key: Optional[str] = None, **kwargs) -> Artifact:
+        """
+        Downloads `url` unless the cached copy is still current.
+
+        `key` identifies the source across runs and defaults to the full URL with
+        its query string. Sources whose URL embeds the publication date should pass
+        a stable key so an identical file under a new URL is still recognised.
+        Other keyword arguments are forwarded to the HTTP client.
+        """
+        if key is None:
+            key = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        metadata = self.read_metadata(key)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if metadata.get("url") == url:
+            if metadata.get("etag"):
+                headers["If-None-Match"] = metadata["etag"]
+            if metadata.get("last_modified"):
+                headers["If-Modified-Since"] = metadata["last_modified"]
+
+        response = http_client.get(url, headers=headers, stream=True, **kwargs)
+        if response.status_code == 304:
+            response.close()
+            return Artifact(key, url, metadata, changed=False)
+        response.raise_for_status()
+
+        # Hash while spooling to disk so the body is never held in memory whole
+        digest = hashlib.sha256()
+        f = tempfile.NamedTemporaryFile()
+        for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+            digest.update(block)
+            f.write(block)
+        f.seek(0)
+
+        new_metadata = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": digest.hexdigest(),
+        }
+
+        if new_metadata["sha256"] == metadata.get("sha256"):
+            f.close()
+            if new_metadata != metadata:
+                # Same bytes under new validators: remember them for the next request
+                self._write_metadata(key, new_metadata)
+            return Artifact(key, url, new_metadata, changed=False)
+
+        return Artifact(key, url, new_metadata, changed=True, file=f)
+
+    def restore(self, artifact: Artifact) -> Artifact:
+        """
+        Attaches the cached body to an unchanged artifact, for sources that have to
+        be reprocessed together with one that changed.
+        """
+        f = tempfile.NamedTemporaryFile()
+        self.s3.download_fileobj(self.bucket, self._object_path(artifact.key, "blob"), f)
+        f.seek(0)
+        artifact.file = f
+        return artifact
+
+    def commit(self, artifact: Artifact) -> None:
+        """
+        Stores a changed artifact and its metadata. Call after the data was loaded.
+        """
+        if not artifact.changed:
+            return
+        self._put(self._object_path(artifact.key, "blob"), artifact.open())
+        self._write_metadata(artifact.key, artifact.metadata)
+        artifact.close()
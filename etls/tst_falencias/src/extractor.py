@@ -1,22 +1,22 @@
 import pandas as pd
-import requests
 import json
 from datetime import datetime
 
+from artifact_cache import Artifact, ArtifactCache
+from documents import clean_cnpj
 from loader import Loader
 
 
 class Extractor(Loader):
     bucket: str = "linker-etl"
-    file_name: str = "raw/tst_falencias/{}.csv".format(
+    file_name: str = "raw/tst_falencias/{}.csv.zst".format(
         datetime.today().strftime("%Y-%m-%d")
     )
 
     def __init__(self) -> None:
         self.URL = "https://bancofalencia.tst.jus.br/rest/consultas/empresas/"
 
-    def get_csv(self) -> str:
-        data = []
+    def download(self, cache: ArtifactCache) -> Artifact:
         params = {
             "razaoSocial": "%",
             "cnpj": "",
@@ -30,13 +30,11 @@ class Extractor(Loader):
             "tipoOcorrencia": "-1",
             "fonte": "-1",
         }
-        response = requests.get(
-            self.URL,
-            params=params
-        )
+        return cache.fetch(self.URL, params=params)
 
+    def get_csv(self, artifact: Artifact) -> str:
         data = (
-            pd.DataFrame(response.json())
+            pd.DataFrame(json.load(artifact.open()))
             .rename(
                 columns={
                     "razaoSocial": "razao_social",
@@ -46,18 +44,24 @@ class Extractor(Loader):
             .drop("dataFormatada", axis=1)
         )
 
-        data["cnpj"] = (
-            data["cnpj"].str.replace(".", "").str.replace("-", "").str.replace("/", "").str.zfill(14)
-        )
+        data["cnpj"], valid = clean_cnpj(data["cnpj"])
+        print(f"Invalid CNPJs: {(~valid & data['cnpj'].notna()).sum()}")
 
         return data
 
 
-def extract():
+def extract(cache: ArtifactCache) -> Artifact:
+    """
+    Uploads the list when it changed upstream. The returned artifact is committed
+    to the cache after loading.
+    """
     extractor = Extractor()
-    df = extractor.get_csv()
-    extractor.upload_file(df, extractor.bucket, extractor.file_name)
+    artifact = extractor.download(cache)
+    if artifact.changed:
+        df = extractor.get_csv(artifact)
+        extractor.upload_file(df, extractor.bucket, extractor.file_name)
+    return artifact
 
 
 if __name__ == "__main__":
-    extract()
+    extract(ArtifactCache())
@@ -0,0 +1,155 @@
+"""
+Shared HTTP client for the extractors.
+
+Every request goes through one pooled keep-alive session per process, so repeated
+calls to the same portal reuse their TLS connection. Concurrent requests are
+limited per host, transient failures (connection errors, timeouts, 429 and 5xx)
+are retried with exponential backoff and jitter, and time spent per host is
+accumulated in counters that can be printed at the end of a run.
+
+At most max_per_host requests (8 by default) are in flight per host, and
+further threads wait for a slot. Callers running a larger thread pool against
+one host set it to their worker count with `configure`.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 120,
+        pool_size: int = 32,
+        max_per_host: int = 8,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+
+        self.session = requests.Session()
+        # Enough pooled connections for every request a host may have in flight
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max(pool_size, max_per_host))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.stats = {}
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def _count(self, host: str, seconds: float = 0.0, retry: bool = False, error: bool = False) -> None:
+        with self._lock:
+            counters = self.stats.setdefault(
+                host, {"requests": 0, "retries": 0, "errors": 0, "seconds": 0.0}
+            )
+            if retry:
+                counters["retries"] += 1
+                return
+            counters["requests"] += 1
+            counters["errors"] += int(error)
+            counters["seconds"] += seconds
+
+    def _wait(self, attempt: int, response: requests.Response = None) -> float:
+        # Full jitter: uniform between zero and the exponential ceiling
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_backoff, float(retry_after)))
+        return delay
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request through the pooled session, retrying transient failures.
+        Accepts the same keyword arguments as `requests.request`. The last response
+        is returned even if its status is still retryable once retries run out.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlparse(url).netloc
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            response = None
+            try:
+                with self._slot(host):
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(host, time.perf_counter() - start, error=True)
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self._count(host, time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response
+                response.close()
+
+            self._count(host, retry=True)
+            time.sleep(self._wait(attempt, response))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def print_stats(self) -> None:
+        for host, counters in sorted(self.stats.items()):
+            print(
+                f"{host}: {counters['requests']} requests, {counters['retries']} retries, "
+                f"{counters['errors']} errors, {counters['seconds']:.1f}s"
+            )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """
+    Returns the process-wide client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def configure(**settings) -> HttpClient:
+    """
+    Replaces the process-wide client with one built with the given HttpClient
+    settings, e.g. max_per_host matching the caller's thread pool. Call it
+    before the first request.
+    """
+    global _client
+    with _client_lock:
+        _client = HttpClient(**settings)
+        return _client
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_client().get(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return get_client().post(url, **kwargs)
+
+
+def print_stats() -> None:
+    get_client().print_stats()
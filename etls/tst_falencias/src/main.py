@@ -1,10 +1,18 @@
+from artifact_cache import ArtifactCache
 from extractor import extract
+import http_client
 from loader import load
 
 
 def lambda_handler(event=None, context=None):
-    extract()
+    cache = ArtifactCache()
+    artifact = extract(cache)
+    http_client.print_stats()
+    if not artifact.changed:
+        print("Falencias unchanged since the last run")
+        return
     load()
+    cache.commit(artifact)
 
 
 if __name__ == "__main__":